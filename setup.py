@@ -43,7 +43,7 @@ setup(
     test_suite='tests',
     entry_points={
         'console_scripts': [
-            'gfl = gfl:gfl',
+            'gfl = gfl:main',
         ],
     },
 )
@@ -1,46 +1,51 @@
-import click
-import webbrowser
+import json
+import os
+import sys
+import time
 
-from contextlib import contextmanager
-from prompt_toolkit import prompt
+import click
 
 from gfl import config
 from gfl import actions
-from gfl.credentials import CredentialsRepository, CredentialsCLI
-from gfl.instances import InstanceCLI, InstanceRepository
-from gfl.workflow import WorkflowRepository, WorkflowCLI
-from gfl.projects import ProjectCLI, ProjectRepository
-from gfl.workspaces import WorkspaceCLI, WorkspaceRepository, WorkspaceSchema
 from gfl import git
-from gfl.jira import Jira
-from gfl import cli
 from gfl import types
-from gfl.issues import Issue, IssueRepository, IssuesCLI
+from gfl.context import Context
 from gfl.util import generate_branch_name
 
-# Initialize repositories
-credentials_repository = CredentialsRepository()
-instance_repository = InstanceRepository()
-workflow_repository = WorkflowRepository()
-issue_repository = IssueRepository()
-project_repository = ProjectRepository()
-workspace_repository = WorkspaceRepository()
+# Repositories, workspace and CLIs are initialized on first use
+context = Context()
+
+# Results of pushes run in background, reported by the next command
+PUSH_RESULTS_FILE = os.path.join(config.DATA_DIR, "pushes.jsonl")
+
 
-# Initialize workspace
-workspace = workspace_repository.get_current_workspace()
+class SessionGroup(click.Group):
+    """Group invoking each command within a storage session."""
 
-# Initialize CLIs
-credentials_cli = CredentialsCLI(credentials_repository)
-instances_cli = InstanceCLI(instance_repository, credentials_repository)
-workflow_cli = WorkflowCLI(workflow_repository)
-issues_cli = IssuesCLI(issue_repository, workspace)
-projects_cli = ProjectCLI(project_repository, instance_repository, workflow_repository)
-workspace_cli = WorkspaceCLI(workspace_repository, project_repository)
+    def invoke(self, ctx):
+        from gfl.db import session
 
+        with session():
+            return super().invoke(ctx)
 
-@click.group(name="git-flow")
+
+@click.group(name="git-flow", cls=SessionGroup)
 def gfl():
     """Git flow."""
+    report_background_pushes()
+
+
+def main():
+    """Entry point. Runs command in gfl daemon, if it is running."""
+    args = sys.argv[1:]
+    if args[:1] != ["daemon"]:
+        from gfl import daemon
+
+        exit_code = daemon.forward(args)
+        if exit_code is not None:
+            sys.exit(exit_code)
+
+    gfl()
 
 
 @gfl.group(name="credentials")
@@ -52,13 +57,13 @@ def credentials():
 @credentials.command(name="add")
 def add_credentials():
     """Add new credentials."""
-    credentials_cli.new()
+    context.credentials_cli.new()
 
 
 @credentials.command(name="list")
 def list_credentials():
     """List available credentials."""
-    credentials_cli.list()
+    context.credentials_cli.list()
 
 
 @gfl.group(name="instances")
@@ -69,13 +74,13 @@ def instances():
 @instances.command(name="add")
 def add_instance():
     """Add new JIRA instance."""
-    instances_cli.new()
+    context.instances_cli.new()
 
 
 @instances.command(name="list")
 def list_instances():
     """List available JIRA instances."""
-    instances_cli.list()
+    context.instances_cli.list()
 
 
 @gfl.group(name="workflows")
@@ -87,13 +92,13 @@ def workflows():
 @workflows.command(name="add")
 def add_workflow():
     """Add new workflow."""
-    workflow_cli.new()
+    context.workflow_cli.new()
 
 
 @workflows.command(name="list")
 def list_workflows():
     """List workflows."""
-    workflow_cli.list()
+    context.workflow_cli.list()
 
 
 @gfl.group(name="projects")
@@ -105,13 +110,13 @@ def projects():
 @projects.command(name="add")
 def add_project():
     """Add new project."""
-    projects_cli.new()
+    context.projects_cli.new()
 
 
 @projects.command(name="list")
 def list_projects():
     """List projects."""
-    projects_cli.list()
+    context.projects_cli.list()
 
 
 @gfl.group()
@@ -123,13 +128,13 @@ def workspaces():
 @workspaces.command(name="list")
 def list_workspaces():
     """List workspaces"""
-    workspace_cli.list()
+    context.workspace_cli.list()
 
 
 @gfl.command()
 def init():
     """Init workspace."""
-    workspace_cli.init()
+    context.workspace_cli.init()
 
 
 @gfl.command()
@@ -140,13 +145,13 @@ def workon(key, keyword):
     require_workspace()
     if not keyword:
         try:
-            issue = issues_cli.all_but_type(types.STORY)[0]
+            issue = context.issues_cli.all_but_type(types.STORY)[0]
         except IndexError:
-            exit("Select issue!")
+            sys.exit("Select issue!")
     else:
         issue_types = [types.STORY, types.TASK, types.BUG]
         issue = get_issue_from_jira(key, keyword, issue_types)
-        issue_repository.save(issue)
+        context.issue_repository.save(issue)
     work_on_issue(issue)
     click.echo("Working on {}".format(issue))
 
@@ -159,10 +164,12 @@ def story():
 
 
 @gfl.command()
-def start():
+@click.option("-o", "--offline", is_flag=True, help="Queue Jira changes in outbox.")
+def start(offline):
     """Start story/task"""
     require_workspace()
-    make_action(actions.START)
+    _, failures = make_action(actions.START, offline)
+    raise_failures(failures)
 
 
 @gfl.command()
@@ -188,34 +195,52 @@ def bug():
 
 @gfl.command()
 @click.option("-s", "--skip-pr", is_flag=True, default=False)
-def review(skip_pr):
+@click.option("-o", "--offline", is_flag=True, help="Queue Jira changes in outbox.")
+@click.option(
+    "--single-push", is_flag=True, help="Push all branches with one git push."
+)
+@click.option(
+    "-b",
+    "--background",
+    is_flag=True,
+    help="Push in background, report results on the next command.",
+)
+def review(skip_pr, offline, single_push, background):
     """Move issue to review"""
     require_workspace()
-    issues = make_action(actions.REVIEW)
-
-    if config.CREATE_PULL_REQUEST:
-        for issue in issues:
-            skip_issue_pr = skip_pr or (issue.type == types.STORY)
-            if not skip_issue_pr:
-                branch = generate_branch_name(workspace.project.workflow, issue)
-                try:
-                    git.push(branch)
-                except:
-                    raise click.ClickException("Failed to push branch!")
-
-                try:
-                    url = workspace.get_pr_url(branch)
-                    webbrowser.open(url)
-                except Exception:
-                    raise click.ClickException("Failed to create PR!")
+    issues, failures = make_action(actions.REVIEW, offline)
+
+    if issues and (offline or config.OFFLINE):
+        click.echo("Branches are not pushed in offline mode.")
+    elif config.CREATE_PULL_REQUEST:
+        workflow = context.workspace.project.workflow
+        branches = [
+            generate_branch_name(workflow, issue)
+            for issue in issues
+            if not (skip_pr or issue.type == types.STORY)
+        ]
+        if background and hasattr(os, "fork"):
+            push_in_background(branches, single_push)
+            click.echo("Pushing in background, results are reported on next command.")
+        else:
+            for branch in branches:
+                click.echo(f"{branch}: pushing...")
+            push_failures = push_and_open_pull_requests(branches, single_push)
+            if push_failures:
+                raise click.ClickException(
+                    "Failed to push branches: {}".format(", ".join(push_failures))
+                )
 
+    raise_failures(failures)
 
 
 @gfl.command()
-def resolve():
+@click.option("-o", "--offline", is_flag=True, help="Queue Jira changes in outbox.")
+def resolve(offline):
     """Resolve issue"""
     require_workspace()
-    make_action(actions.RESOLVE)
+    _, failures = make_action(actions.RESOLVE, offline)
+    raise_failures(failures)
 
 
 @gfl.command()
@@ -223,7 +248,7 @@ def resolve():
 def commit(message):
     """Commit for issue"""
     require_workspace()
-    issue_key = workspace.current_issue
+    issue_key = context.workspace.current_issue
     git.commit("{} {}".format(issue_key, message))
 
 
@@ -231,8 +256,8 @@ def commit(message):
 def publish():
     """Push branch to origin"""
     require_workspace()
-    issue = issue_repository.find_by_key(workspace.current_issue)
-    branch = generate_branch_name(workspace.project.workflow, issue)
+    issue = context.issue_repository.find_by_key(context.workspace.current_issue)
+    branch = generate_branch_name(context.workspace.project.workflow, issue)
     git.push(branch)
 
 
@@ -240,76 +265,245 @@ def publish():
 def finish():
     """Finish story"""
     require_workspace()
-    issues = issues_cli.all_but_type(types.SUBTASK)
+    issues = context.issues_cli.all_but_type(types.SUBTASK)
 
     for issue in issues:
-        if workspace.current_issue  == issue.key:
-            workspace.current_issue = None
-        issue_repository.remove(issue)
+        if context.workspace.current_issue  == issue.key:
+            context.workspace.current_issue = None
+        context.issue_repository.remove(issue)
 
-    if workspace.current_issue is None:
+    if context.workspace.current_issue is None:
         click.echo("Choose issue to work on.")
-        choices = issues_cli.choose_by_types(types.STORY)
+        choices = context.issues_cli.choose_by_types(types.STORY)
         if choices:
             issue = choices[0]
-            workspace.current_issue = issue.key
+            context.workspace.current_issue = issue.key
 
-    workspace_repository.update(workspace)
+    context.workspace_repository.update(context.workspace)
 
 
 @gfl.command()
-def status():
+@click.option("-s", "--sync", is_flag=True, help="Sync issues changed in Jira first.")
+def status(sync):
     """Get work status"""
-    if workspace:
-        click.echo(f"Current issue: {workspace.current_issue}")
+    if context.workspace and (sync or config.AUTO_SYNC):
+        try:
+            sync_issues()
+        except Exception as e:
+            click.echo(f"Unable to sync issues: {e}")
+    if context.workspace:
+        click.echo(f"Current issue: {context.workspace.current_issue}")
     click.echo("Status:")
-    issues_cli.choose_interactive(filter_function=lambda issue: False, show_only=True)
+    context.issues_cli.choose_interactive(
+        filter_function=lambda issue: False, show_only=True
+    )
+
+
+@gfl.command()
+@click.option("-f", "--full", is_flag=True, help="Refresh all issues.")
+def sync(full):
+    """Sync issues between Jira and local storage"""
+    require_workspace()
+    synced, missing = sync_issues(full)
+    click.echo(f"Synced {synced} issues.")
+    for key in sorted(missing):
+        click.echo(f"Issue {key} not found in Jira.")
+
+
+@gfl.group(name="outbox")
+def outbox_commands():
+    """Manage Jira changes queued in offline mode."""
+    pass
+
+
+@outbox_commands.command(name="list")
+def list_outbox():
+    """List queued changes."""
+    entries = context.outbox.entries()
+    if not entries:
+        click.echo("Outbox is empty.")
+    for entry in entries:
+        line = f"{entry['issue']}: {entry['action']}"
+        if entry["error"]:
+            line += f" (attempts: {entry['attempts']}, error: {entry['error']})"
+        click.echo(line)
+
+
+@outbox_commands.command(name="flush")
+def flush_outbox():
+    """Send queued changes to Jira."""
+    failed = replay_outbox()
+    if failed:
+        raise click.ClickException(f"{len(failed)} changes left in outbox.")
+
+
+@outbox_commands.command(name="drop")
+@click.argument("key", type=str)
+def drop_outbox(key):
+    """Drop queued changes of issue."""
+    removed = context.outbox.drop(key)
+    click.echo(f"Removed {removed} entries.")
+
+
+@gfl.group(name="daemon")
+def daemon_commands():
+    """Manage background daemon."""
+    pass
+
+
+@daemon_commands.command(name="start")
+@click.option("-d", "--detach", is_flag=True, help="Run in background.")
+def start_daemon(detach):
+    """Start daemon serving gfl commands."""
+    from gfl import daemon
+
+    if not daemon.is_supported():
+        raise click.ClickException("Daemon is not supported on this platform.")
+    if daemon.is_running():
+        raise click.ClickException("Daemon is already running.")
+
+    if detach:
+        if not daemon.detach():
+            click.echo("Daemon started.")
+            return
+        daemon.serve()
+        os._exit(0)
+
+    click.echo(f"Serving on {daemon.SOCKET_PATH}")
+    daemon.serve()
+
+
+@daemon_commands.command(name="stop")
+def stop_daemon():
+    """Stop daemon."""
+    from gfl import daemon
+
+    if not daemon.stop():
+        raise click.ClickException("Daemon is not running.")
+    click.echo("Daemon stopped.")
+
+
+@daemon_commands.command(name="status")
+def daemon_status():
+    """Show daemon status."""
+    from gfl import daemon
+
+    if daemon.is_running():
+        click.echo("Daemon is running.")
+    else:
+        click.echo("Daemon is not running.")
+
+
+@gfl.group(name="cache")
+def cache_commands():
+    """Manage JIRA metadata cache."""
+    pass
+
+
+@cache_commands.command(name="warm")
+def warm_cache():
+    """Fetch JIRA metadata of workspace project."""
+    require_workspace()
+    jira = context.workspace.get_jira_connection()
+    jira.warm_cache()
+    click.echo("Cache warmed.")
+
+
+@cache_commands.command(name="stats")
+def cache_stats():
+    """Show cached entries."""
+    from gfl.cache import Cache
+
+    for kind, stats in Cache().stats().items():
+        click.echo(f"{kind}: {stats['entries']} entries, {stats['expired']} expired")
 
 
-# TODO: FIX issue syncing
-# @gfl.command()
-# def sync():
-#     """Sync stories between Jira and local storage"""
-#     jira = workspace.get_jira_connection()
-#     remote_stories = [
-#         jira.get_issue_by_key(story.key) for story in storage.get_stories()
-#     ]
-#     storage.sync(remote_stories)
+@cache_commands.command(name="clear")
+@click.option("-k", "--kind", type=str, help="Clear only entries of given kind.")
+def clear_cache(kind):
+    """Remove cached entries."""
+    from gfl.cache import Cache
+
+    removed = Cache().clear(kind)
+    click.echo(f"Removed {removed} entries.")
+
+
+def sync_issues(full=False):
+    """
+    Sync workspace project issues with Jira.
+
+    Unless full sync is requested, only issues (and subtasks) updated since
+    the last sync of the workspace are fetched. Return number of synced
+    issues and keys of issues not found in Jira.
+    """
+    workspace = context.workspace
+    prefix = f"{workspace.project.key}-"
+    keys = [
+        key for key in context.issue_repository.stored_keys() if key.startswith(prefix)
+    ]
+
+    jira = workspace.get_jira_connection()
+    started = time.time()
+    missing = set()
+    if full or workspace.last_sync is None:
+        remote_issues = jira.get_issues_by_keys(keys)
+        context.issue_repository.sync(remote_issues)
+        missing = set(keys) - {issue.key for issue in remote_issues}
+    else:
+        # Rounded up, with one more minute for clock skew
+        minutes = int((started - workspace.last_sync) // 60) + 2
+        remote_issues = jira.get_updated_issues(keys, minutes)
+        for parent_key, issue in remote_issues:
+            if parent_key is None:
+                context.issue_repository.sync([issue])
+            else:
+                context.issue_repository.sync_subtask(parent_key, issue)
+
+    workspace.last_sync = started
+    context.workspace_repository.update(workspace)
+    return len(remote_issues), missing
 
 
 def work_on_issue(issue):
     """Work on issue"""
     if issue.type != types.STORY:
         checkout_branch(issue)
-        workspace.current_issue = issue.key
-        workspace_repository.update(workspace)
+        context.workspace.current_issue = issue.key
+        context.workspace_repository.update(context.workspace)
 
 
 def checkout_branch(issue):
     """Checkout issue Git branch."""
-    branch = generate_branch_name(workspace.project.workflow, issue)
+    branch = generate_branch_name(context.workspace.project.workflow, issue)
     git.checkout(branch)
 
 
 def create_issue(type, start_progress=True):
     """Create Jira issue and return model."""
     try:
-        fields = issues_cli.new(type)
-
-        jira = workspace.get_jira_connection()
+        jira = context.workspace.get_jira_connection()
+        # Checked before user fills the issue in
+        project = context.workspace.project
+        type_name = project.workflow.get_type_mapping(type)
+        if not jira.has_issue_type(type_name):
+            raise click.ClickException(
+                f"Issue type {type_name} cannot be created in project {project.key}."
+            )
+
+        fields = context.issues_cli.new(type)
         issue = jira.create_issue(fields)
 
         if start_progress:
-            action = workspace.get_action(actions.START)
+            action = context.workspace.get_action(actions.START)
             jira.make_action(action, issue)
 
         if issue.type == types.SUBTASK:
             parent_key = fields["parent"]["key"]
-            parent = issue_repository.find_by_key(parent_key)
+            parent = context.issue_repository.find_by_key(parent_key)
             parent.add_subtask(issue)
-            issue_repository.update(parent)
+            context.issue_repository.update(parent)
         else:
-            issue_repository.save(issue)
+            context.issue_repository.save(issue)
 
         work_on_issue(issue)
 
@@ -326,40 +520,304 @@ def get_issue_from_jira(is_key, keyword, types):
     Return internal issue model.
     """
     try:
-        jira = workspace.get_jira_connection()
+        jira = context.workspace.get_jira_connection()
         keyword = " ".join(keyword)
         if is_key:
             return jira.get_issue_by_key(keyword)
 
-        issues = jira.search_issues(keyword, types=types)
-        if not issues:
-            exit("No issues found with selected keyword: {}!".format(keyword))
-        elif len(issues) > 1:
-            return issues_cli.choose_issues_from_simple_view(issues)
-        else:
-            return issues[0]
+        pages = jira.iter_search_pages(keyword, types=types)
+        issues = context.issues_cli.choose_from_search(pages)
+        if issues is None:
+            sys.exit("No issues found with selected keyword: {}!".format(keyword))
+        elif not issues:
+            sys.exit("No issue chosen.")
+        return issues[0]
 
     except Exception as e:
         # raise click.ClickException(e)
         raise e
 
 
-def make_action(action):
-    action = workspace.get_action(action)
-    issues = issues_cli.choose_by_status(action.initial_state)
-    jira = workspace.get_jira_connection()
-    for issue in issues:
-        issue = jira.make_action(action, issue)
-        issue_repository.update(issue)
+def make_action(action, offline=False):
+    """
+    Perform action on chosen issues.
+
+    Issues are processed concurrently, transitions of each issue in order.
+    In offline mode, when Jira is unreachable or when issue has changes
+    waiting in outbox already, the action is applied locally and queued.
+    Return issues moved by the action and (issue, error) pairs of failed ones.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from requests.exceptions import ConnectionError, Timeout
+    from gfl.storage import buffered_writes
+
+    action = context.workspace.get_action(action)
+    issues = context.issues_cli.choose_by_status(action.initial_state)
+    offline = offline or config.OFFLINE
+
+    queued = [
+        issue
+        for issue in issues
+        if offline or context.outbox.has_pending(issue.key)
+    ]
+    queued_issues = set(queued)
+    online = [issue for issue in issues if issue not in queued_issues]
+
+    moved = []
+    failures = []
+    # Moved issues are stored even if the command fails afterwards
+    with buffered_writes(), ThreadPoolExecutor(config.CONCURRENCY) as executor:
+        for issue in queued:
+            queue_action(action, issue)
+            moved.append(issue)
+
+        if online:
+            jira = context.workspace.get_jira_connection()
+            futures = {
+                executor.submit(jira.make_action, action, issue): issue
+                for issue in online
+            }
+        else:
+            futures = {}
+
+        for future in as_completed(futures):
+            issue = futures[future]
+            try:
+                future.result()
+            except (ConnectionError, Timeout):
+                queue_action(action, issue)
+                moved.append(issue)
+            except Exception as e:
+                click.echo(f"{issue.key}: failed ({e})", err=True)
+                failures.append((issue, e))
+            else:
+                click.echo(f"{issue.key}: {action.next_state}")
+                context.issue_repository.update(issue)
+                moved.append(issue)
+
+    # Keep order of chosen issues
+    positions = {issue: position for position, issue in enumerate(issues)}
+    moved.sort(key=positions.get)
+    return moved, failures
+
+
+def push_branches(branches, single_push=False):
+    """
+    Push branches concurrently, or all with single git push.
+
+    Yield (branch, error) pairs as pushes finish, error is None on success.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    if not branches:
+        return
+
+    if single_push:
+        # Single missing branch would fail the whole push
+        local = git.existing_branches(branches, remote=None)
+        for branch in branches:
+            if branch not in local:
+                yield branch, "No local branch"
+        pushed = [branch for branch in branches if branch in local]
+        if pushed:
+            yield from git.push_all(pushed).items()
+        return
+
+    # Concurrent `git push -u` would compete for .git/config lock, upstreams
+    # are set one at a time instead
+    with ThreadPoolExecutor(config.CONCURRENCY) as executor:
+        futures = {
+            executor.submit(git.push_all, [branch], set_upstream=False): branch
+            for branch in branches
+        }
+        for future in as_completed(futures):
+            branch = futures[future]
+            error = future.result()[branch]
+            if error is None:
+                error = git.set_upstream(branch)
+            yield branch, error
+
+
+def push_and_open_pull_requests(branches, single_push=False, echo=click.echo):
+    """Push branches and open pull request of each pushed one. Return failed."""
+    import webbrowser
+
+    failed = []
+    for branch, error in push_branches(branches, single_push):
+        if error is not None:
+            echo(f"{branch}: push failed ({error})")
+            failed.append(branch)
+            continue
+
+        try:
+            webbrowser.open(context.workspace.get_pr_url(branch))
+        except Exception as e:
+            echo(f"{branch}: pushed, failed to create PR ({e})")
+            failed.append(branch)
+        else:
+            echo(f"{branch}: pushed")
+    return failed
+
+
+def push_in_background(branches, single_push=False):
+    """Push branches in forked process, which records results for next command."""
+    if os.fork():
+        return
+
+    # Pushing process must not touch the terminal nor the command session
+    try:
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+
+        def record(message):
+            with open(PUSH_RESULTS_FILE, "a") as f:
+                f.write(json.dumps({"time": time.time(), "message": message}) + "\n")
+
+        push_and_open_pull_requests(branches, single_push, echo=record)
+    finally:
+        os._exit(0)
+
+
+def report_background_pushes():
+    """Print results recorded by pushes run in background."""
+    reading = f"{PUSH_RESULTS_FILE}.reading"
+    try:
+        os.replace(PUSH_RESULTS_FILE, reading)
+    except FileNotFoundError:
+        return
+
+    with open(reading, "r") as f:
+        results = [json.loads(line) for line in f if line.strip()]
+    os.unlink(reading)
+
+    click.echo("Background push results:")
+    for result in results:
+        click.echo(f"  {result['message']}")
+
+
+def queue_action(action, issue):
+    """Apply action to local issue and queue it in outbox."""
+    context.outbox.add(context.workspace.project, issue, action)
+    issue.status = action.next_state
+    context.issue_repository.update(issue)
+    click.echo(f"{issue.key}: {action.next_state} (queued)")
+
+
+def replay_outbox():
+    """
+    Send actions queued in outbox to Jira.
+
+    Issues are processed concurrently, entries of each issue in order. Entry
+    of issue which was moved in Jira meanwhile is reported as a conflict and
+    dropped, local issue gets the remote status. Return entries which failed.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from gfl import outbox
+    from gfl.storage import buffered_writes
+
+    entries = {}
+    for entry in context.outbox.entries():
+        entries.setdefault(entry["issue"], []).append(entry)
+
+    projects = {}
+    connections = {}
+    for issue_entries in entries.values():
+        project_id = issue_entries[0]["project"]
+        if project_id not in projects:
+            projects[project_id] = context.project_repository.find_by_id(project_id)
+            connections[project_id] = projects[project_id].get_jira_connection()
+
+    def replay(issue_entries):
+        results = []
+        for entry in issue_entries:
+            project = projects[entry["project"]]
+            action = project.workflow.get_action(entry["action"])
+            try:
+                outcome, status = replay_entry(
+                    connections[entry["project"]], action, entry["issue"]
+                )
+            except Exception as e:
+                # Following entries of the issue depend on this one
+                results.append((entry, outbox.FAILED, e))
+                break
+            results.append((entry, outcome, status))
+            if outcome == outbox.CONFLICT:
+                break
+        return results
+
+    failed = []
+    # Results are stored even if the command fails afterwards
+    with buffered_writes(), ThreadPoolExecutor(config.CONCURRENCY) as executor:
+        futures = [executor.submit(replay, e) for e in entries.values()]
+        for future in as_completed(futures):
+            for entry, outcome, detail in future.result():
+                key = entry["issue"]
+                if outcome == outbox.FAILED:
+                    click.echo(f"{key}: {entry['action']} failed ({detail})", err=True)
+                    context.outbox.failed(entry, detail)
+                    failed.append(entry)
+                    continue
+
+                if outcome == outbox.CONFLICT:
+                    click.echo(
+                        f"{key}: conflict, {entry['action']} skipped, "
+                        f"issue is {detail} in Jira",
+                        err=True,
+                    )
+                    # Later entries of the issue are outdated as well
+                    context.outbox.drop(key)
+                elif outcome == outbox.APPLIED:
+                    click.echo(f"{key}: {detail} already")
+                    context.outbox.remove(entry)
+                else:
+                    click.echo(f"{key}: {detail}")
+                    context.outbox.remove(entry)
+
+                issue = context.issue_repository.find_by_key(key)
+                if issue is not None and issue.status != detail:
+                    issue.status = detail
+                    context.issue_repository.update(issue)
+
+    return failed
+
+
+def replay_entry(jira, action, key):
+    """
+    Perform queued action on issue, retrying when Jira is unreachable.
+
+    Return outcome and status of the issue in Jira.
+    """
+    from requests.exceptions import ConnectionError, Timeout
+    from gfl import outbox
+
+    for attempt in range(config.OUTBOX_RETRIES):
+        try:
+            issue = jira.get_issue_by_key(key)
+            if issue.status == action.next_state:
+                return outbox.APPLIED, issue.status
+            if issue.status != action.initial_state:
+                return outbox.CONFLICT, issue.status
+            jira.make_action(action, issue)
+            return outbox.SENT, issue.status
+        except (ConnectionError, Timeout):
+            if attempt == config.OUTBOX_RETRIES - 1:
+                raise
+            time.sleep(2 ** attempt)
+
 
-    return issues
+def raise_failures(failures):
+    if failures:
+        keys = ", ".join(issue.key for issue, _ in failures)
+        raise click.ClickException(f"Action failed for: {keys}")
 
 
 def require_workspace():
-    if not workspace:
+    if not context.workspace:
         print("Cannot run outside of workspace")
         print("Run 'gfl init' to initialize workspace")
-        exit(1)
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,3 @@
-from marshmallow import Schema, fields, post_load
-
 from gfl import statuses
 
 START = "start"
@@ -18,21 +16,6 @@ class Action:
         self.assign_to_user = False
 
 
-class ActionSchema(Schema):
-    name = fields.Str()
-    initial_state = fields.Str()
-    transitions = fields.List(fields.Str(), allow_none=True)
-    next_state = fields.Str()
-    assign_to_user = fields.Bool()
-
-    @post_load
-    def deserialize(self, data, **kwargs):
-        a = Action(data["name"], data["initial_state"], data["next_state"])
-        a.transitions = data["transitions"]
-        a.assign_to_user = data["assign_to_user"]
-        return a
-
-
 class Start(Action):
     def __init__(self):
         super().__init__(START, statuses.OPEN, statuses.IN_PROGRESS)
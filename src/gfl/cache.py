@@ -0,0 +1,50 @@
+"""Persistent cache of JIRA metadata."""
+import time
+
+from gfl import config
+from gfl.storage import get_table
+
+TRANSITIONS = "transitions"
+CREATEMETA = "createmeta"
+
+KINDS = [TRANSITIONS, CREATEMETA]
+
+
+class Cache:
+    """Cache of JSON values with per-entry expiration, kept in data directory."""
+
+    def __init__(self):
+        self.db = get_table("cache", "key")
+
+    def get(self, key):
+        """Get cached value or None if it is missing or expired."""
+        entry = self.db.find(key)
+        if entry is None or entry["expires"] < time.time():
+            return None
+        return entry["value"]
+
+    def set(self, kind, key, value):
+        """Cache value for the time to live configured for its kind."""
+        expires = time.time() + config.CACHE_TTL[kind]
+        self.db.upsert({"key": key, "kind": kind, "value": value, "expires": expires})
+
+    def delete(self, key):
+        self.db.remove(key)
+
+    def clear(self, kind=None):
+        """Remove all entries, or entries of given kind. Return their count."""
+        entries = [e for e in self.db.all() if kind is None or e["kind"] == kind]
+        for entry in entries:
+            self.db.remove(entry["key"])
+        return len(entries)
+
+    def stats(self):
+        """Return number of entries and expired entries by kind."""
+        stats = {kind: {"entries": 0, "expired": 0} for kind in KINDS}
+        now = time.time()
+        for entry in self.db.all():
+            kind = stats.setdefault(entry["kind"], {"entries": 0, "expired": 0})
+            kind["entries"] += 1
+            if entry["expires"] < now:
+                kind["expired"] += 1
+        return stats
@@ -1,4 +1,9 @@
 """Cli module"""
+import asyncio
+import bisect
+import functools
+import threading
+
 import click
 
 from gfl import config
@@ -6,8 +11,8 @@ from gfl import types
 
 from prompt_toolkit import print_formatted_text, HTML
 from prompt_toolkit.layout.screen import Point
-from prompt_toolkit.application import Application, get_app
-from prompt_toolkit.filters import IsDone
+from prompt_toolkit.application import Application
+from prompt_toolkit.filters import Condition, IsDone
 from prompt_toolkit.formatted_text import FormattedText
 from prompt_toolkit.key_binding import KeyBindings
 from prompt_toolkit.keys import Keys
@@ -19,208 +24,333 @@ from prompt_toolkit.layout.dimension import LayoutDimension as D
 from prompt_toolkit.mouse_events import MouseEventType
 from prompt_toolkit.styles import Style
 
-
-from prompt_toolkit.cache import SimpleCache
-from prompt_toolkit.filters import to_filter
-from prompt_toolkit.formatted_text import to_formatted_text
-from prompt_toolkit.formatted_text.utils import split_lines, fragment_list_to_text
-from prompt_toolkit.utils import get_cwidth
-
 UNCHECKED = '\u25cb '
 CHECKED = '\u25cf '
 POINTER = ' \u276f '
 
 
-class DynamicFormattedTextControl(UIControl):
+class IssuesController(UIControl):
     """
-    Control that displays formatted text dynamically. This can be either plain
-    text, an :class:`~prompt_toolkit.formatted_text.HTML` object an
-    :class:`~prompt_toolkit.formatted_text.ANSI` object or a list of
-    ``(style_str, text)`` tuples, depending on how you prefer to do the
-    formatting. See ``prompt_toolkit.layout.formatted_text`` for more
-    information.
-
-    The get_text is callable which is dynamically returning text to render.
+    Issues list rendering only the lines displayed by its window.
+
+    Fragments of each line are cached along with the pointer and selection
+    state they were rendered for, so moving the pointer re-renders two lines.
+    Pointer moves to the next (previous) enabled choice in constant time.
+
+    Choices can be filtered by text matched against their keys and summaries.
+    Lines show choices matching the filter, ``pointer_index`` is a line.
     """
-    def __init__(self, get_text, style='', focusable=False, key_bindings=None,
-                 show_cursor=False, modal=False, get_cursor_position=None):
-        from prompt_toolkit.key_binding.key_bindings import KeyBindingsBase
-        assert key_bindings is None or isinstance(key_bindings, KeyBindingsBase)
-        assert isinstance(show_cursor, bool)
-        assert isinstance(modal, bool)
-        assert get_cursor_position is None or callable(get_cursor_position)
+    def __init__(self, message, choices, pointer_index=0):
+        self.message = message
+        self.pointer_index = pointer_index
+        self.answered = False
+        # Selected issues in order of selection
+        self.selected = {}
+        # Filter is being typed
+        self.filtering = False
+        self._init_choices(choices)
 
-        self.get_text = get_text
-        self.style = style
-        self.focusable = to_filter(focusable)
+    @property
+    def line_count(self):
+        return len(self.visible)
 
-        self.get_cursor_position = get_cursor_position
+    @property
+    def filter_text(self):
+        return self._filters[-1][0]
 
-        # Key bindings.
-        self.key_bindings = key_bindings
-        self.show_cursor = show_cursor
-        self.modal = modal
+    def has_active_choices(self):
+        return self._active_count > 0
 
-        #: Cache for the content.
-        self._content_cache = SimpleCache(maxsize=18)
-        self._fragment_cache = SimpleCache(maxsize=1)
-        # Only cache one fragment list. We don't need the previous item.
+    def preferred_height(self, width, max_available_height, wrap_lines,
+                         get_line_prefix):
+        return self.line_count
 
-        # Render info for the mouse support.
-        self._fragments = None
+    def create_content(self, width, height):
+        return UIContent(get_line=self.get_line,
+                         line_count=self.line_count,
+                         cursor_position=Point(2, self.pointer_index),
+                         show_cursor=False)
+
+    def get_line(self, line):
+        index = self.visible[line]
+        issue = self.choices[index][1]
+        state = (line == self.pointer_index, issue in self.selected)
+        cached = self._lines[index]
+        if cached is None or cached[0] != state:
+            cached = (state, self._render_line(index, *state))
+            self._lines[index] = cached
+        return cached[1]
+
+    def _render_line(self, index, pointed_at, selected):
+        name, issue, disabled = self.choices[index]
+        line = []
+
+        if issue.type == types.SUBTASK:
+            line.append(('class:default', '   '))
+
+        if pointed_at:
+            line.append(('class:pointer', POINTER))
+        else:
+            line.append(('class:default', '   '))
 
-    def reset(self):
-        self._fragments = None
+        if disabled:
+            line.append(('class:default', '- '))
+        else:
+            if selected:
+                line.append(('class:sel_issue', CHECKED))
+            else:
+                line.append(('class:default', UNCHECKED))
 
-    def is_focusable(self):
-        return self.focusable()
+        line.append(render_issue_key(issue))
+        line.append(('class:default', ' %s' % name))
+        line.append(render_badge(issue))
+        return line
 
-    def __repr__(self):
-        return '%s(%r)' % (self.__class__.__name__, self.get_text())
+    def mouse_handler(self, mouse_event):
+        if mouse_event.event_type == MouseEventType.MOUSE_DOWN:
+            line = mouse_event.position.y
+            self.toggle(line)
 
-    def _get_formatted_text_cached(self):
-        """
-        Get fragments, but only retrieve fragments once during one render run.
-        (This function is called several times during one rendering, because
-        we also need those for calculating the dimensions.)
-        """
-        return self._fragment_cache.get(
-            get_app().render_counter,
-            lambda: to_formatted_text(self.get_text(), self.style))
+    def toggle(self, line):
+        _, pointed_choice, disabled = self.choices[self.visible[line]]
+        if disabled:
+            return
+        if pointed_choice in self.selected:
+            del self.selected[pointed_choice]
+        else:
+            self.selected[pointed_choice] = None
 
-    def preferred_width(self, max_available_width):
-        """
-        Return the preferred width for this control.
-        That is the width of the longest line.
+    def move_down(self):
+        if self._enabled_count:
+            self.pointer_index = self._next_enabled[self.pointer_index]
+
+    def move_up(self):
+        if self._enabled_count:
+            self.pointer_index = self._prev_enabled[self.pointer_index]
+
+    def set_filter(self, text):
         """
-        text = fragment_list_to_text(self._get_formatted_text_cached())
-        line_lengths = [get_cwidth(l) for l in text.split('\n')]
-        return max(line_lengths)
+        Show choices containing every word of the text.
 
-    def preferred_height(self, width, max_available_height, wrap_lines, get_line_prefix):
-        content = self.create_content(width, None)
-        return content.line_count
+        Choices shown for shorter filters are kept, so the text extended
+        with a character narrows the previous result instead of all choices
+        and removing a character restores the previous result.
+        """
+        pointed = self.visible[self.pointer_index] if self.visible else None
+
+        while not text.startswith(self._filters[-1][0]):
+            self._filters.pop()
+        if text != self._filters[-1][0]:
+            self._filters.append((text, self._match(text, self._filters[-1][1])))
+
+        self._index_enabled()
+        position = bisect.bisect_left(self.visible, pointed or 0)
+        if position < self.line_count and self.visible[position] == pointed:
+            self.pointer_index = position
+        elif self._enabled_count:
+            # First enabled line, wrapping from the last one
+            self.pointer_index = self._next_enabled[-1]
+        else:
+            self.pointer_index = 0
 
-    def create_content(self, width, height):
-        # Get fragments
-        fragments_with_mouse_handlers = self._get_formatted_text_cached()
-        fragment_lines_with_mouse_handlers = list(split_lines(fragments_with_mouse_handlers))
-
-        # Strip mouse handlers from fragments.
-        fragment_lines = [
-            [tuple(item[:2]) for item in line]
-            for line in fragment_lines_with_mouse_handlers
+    def _match(self, text, indexes):
+        words = text.lower().split()
+        return [
+            i for i in indexes
+            if all(word in self._search[i] for word in words)
         ]
 
-        # Keep track of the fragments with mouse handler, for later use in
-        # `mouse_handler`.
-        self._fragments = fragments_with_mouse_handlers
+    @property
+    def visible(self):
+        return self._filters[-1][1]
 
-        cursor_position = self.get_cursor_position()
+    def get_formatted_choices(self):
+        choices = []
+        for line in range(self.line_count):
+            choices.extend(self.get_line(line))
+            choices.append(('class:default', '\n'))
+        return choices
 
-        # Create content, or take it from the cache.
-        key = (tuple(fragments_with_mouse_handlers), width, cursor_position)
+    def _init_choices(self, choices):
+        self.choices = []
+        self._lines = []
+        self._search = []
+        self._active_count = 0
+        # Filters applied so far, with lines (indexes of choices) they show
+        self._filters = [('', [])]
+        self._pointer_set = self.pointer_index != 0
+        self.append_choices(choices)
+
+    def append_choices(self, choices):
+        start = len(self.choices)
+        for c in choices:
+            name = c['name']
+            issue = c.get('issue', name)
+            disabled = c.get('disabled', None)
 
-        def get_content():
-            return UIContent(get_line=lambda i: fragment_lines[i],
-                             line_count=len(fragment_lines),
-                             cursor_position=cursor_position,
-                             show_cursor=self.show_cursor)
+            # set pointer on the first available choice
+            if not self._pointer_set and not disabled:
+                self.pointer_index = len(self.choices)
+                self._pointer_set = True
 
-        return self._content_cache.get(key, get_content)
+            self.choices.append((name, issue, disabled))
+            self._lines.append(None)
+            self._search.append(
+                c.get('search') or ('%s %s' % (issue.key, name)).lower())
+            if not disabled:
+                self._active_count += 1
+
+        added = range(start, len(self.choices))
+        for text, lines in self._filters:
+            lines.extend(self._match(text, added))
+        self._index_enabled()
+
+    def _index_enabled(self):
+        """Precompute next and previous enabled line of each line."""
+        count = self.line_count
+        enabled = [
+            line for line in range(count)
+            if not self.choices[self.visible[line]][2]
+        ]
+        self._enabled_count = len(enabled)
+        self._next_enabled = [None] * count
+        self._prev_enabled = [None] * count
+        if not enabled:
+            return
+
+        # Wrap around to the first (last) enabled line
+        next_enabled = enabled[0]
+        for line in reversed(range(count)):
+            self._next_enabled[line] = next_enabled
+            if not self.choices[self.visible[line]][2]:
+                next_enabled = line
+
+        prev_enabled = enabled[-1]
+        for line in range(count):
+            self._prev_enabled[line] = prev_enabled
+            if not self.choices[self.visible[line]][2]:
+                prev_enabled = line
 
-    def is_modal(self):
-        return self.modal
+    @property
+    def pointed_issue(self):
+        if self._pointer_set and self.visible:
+            return self.choices[self.visible[self.pointer_index]][1]
 
-    def get_key_bindings(self):
-        return self.key_bindings
 
+def select_issue(choices, pointer_index, msg):
+    controller = IssuesController(message='choose issues', choices=choices,
+                                  pointer_index=pointer_index)
+    app = create_application(controller, msg)
 
-class IssuesController(DynamicFormattedTextControl):
-    def __init__(self, message, choices, pointer_index=0):
-        self.message = message
-        self.pointer_index = pointer_index
-        self.answered = False
-        self.selected = []
-        self._init_choices(choices)
-        super(IssuesController, self).__init__(
-            self.get_formatted_choices,
-            show_cursor=False,
-            get_cursor_position=lambda: Point(2, self.pointer_index))
+    if controller.has_active_choices():
+        result = app.run()
+        return result
+    else:
+        print_formatted_text(
+            FormattedText(controller.get_formatted_choices()),
+            style=STYLE)
+        return []
 
-    @property
-    def line_count(self):
-        return len(self.choices)
 
-    def has_active_choices(self):
-        for choice in self.choices:
-            if not choice[2]:
-                return True
-        return False
+def select_issue_from_pages(pages, msg):
+    """
+    Choose issue from results arriving page by page.
 
-    def mouse_handler(self, mouse_event):
-        if mouse_event.event_type == MouseEventType.MOUSE_DOWN:
-            index = mouse_event.position.y
-            self.toggle(index)
+    Picker opens immediately and pages are fetched in background thread,
+    so issue can be chosen before all pages arrive. Enter chooses issues
+    toggled with space or, if none is toggled, the pointed one.
 
-    def toggle(self, index):
-        pointed_choice = self.choices[index][1]
-        if pointed_choice in self.selected:
-            self.selected.remove(pointed_choice)
+    Return None if no issues were found.
+    """
+    controller = IssuesController(message='choose issues', choices=[])
+    search = {'status': 'Searching...'}
+    cancelled = threading.Event()
+
+    def get_status():
+        return [('class:separator', search['status'])]
+
+    app = create_application(controller, msg, get_status=get_status,
+                             choose_pointed=True)
+
+    def add_page(page):
+        controller.append_choices(
+            [{'name': issue.summary, 'issue': issue} for issue in page])
+        search['status'] = 'Searching... %d found' % len(controller.choices)
+        app.invalidate()
+
+    def finish():
+        # Lines left by filter do not count, only issues found
+        found = len(controller.choices)
+        search['status'] = '%d found' % found
+        if not found:
+            app.exit(result=None)
+        elif found == 1:
+            app.exit(result=[controller.choices[0][1]])
         else:
-            self.selected.append(pointed_choice)
+            app.invalidate()
 
-    def get_formatted_choices(self):
-        choices = []
-        for i, choice in enumerate(self.choices):
-            name = choice[0]
-            issue = choice[1]
-            selected = (issue in self.selected)
-            pointed_at = (i == self.pointer_index)
+    def fail(error):
+        if not controller.choices:
+            app.exit(exception=error)
+        else:
+            search['status'] = 'Search failed: %s' % error
+            app.invalidate()
+
+    def fetch(call_in_loop):
+        def post(callback, *args):
+            if cancelled.is_set():
+                return False
+            try:
+                call_in_loop(functools.partial(callback, *args))
+            except (RuntimeError, OSError):
+                # picker closed in the meantime
+                return False
+            return True
 
-            if issue.type == types.SUBTASK:
-                choices.append(('class:default', '   '))
+        try:
+            for page in pages:
+                if not post(add_page, page):
+                    return
+        except Exception as e:
+            post(fail, e)
+        else:
+            post(finish)
 
-            if pointed_at:
-                choices.append(('class:pointer', POINTER))
-            else:
-                choices.append(('class:default', '   '))
+    def start_fetching():
+        threading.Thread(target=fetch, args=(get_call_in_loop(),),
+                         daemon=True).start()
 
-            if choice[2]:  # disabled
-                choices.append(('class:default', '- '))
-            else:
-                if selected:
-                    choices.append(('class:sel_issue', CHECKED))
-                else:
-                    choices.append(('class:default', UNCHECKED))
-
-            choices.append(render_issue_key(issue))
-            choices.append(('class:default', ' %s' % name))
-            choices.append(render_badge(issue))
-            choices.append(('class:default', '\n'))
+    try:
+        return app.run(pre_run=start_fetching)
+    finally:
+        cancelled.set()
 
-        return choices
 
-    def _init_choices(self, choices):
-        self.choices = []
-        pointer_not_set = True if self.pointer_index == 0 else False
+def get_call_in_loop():
+    """
+    Return function calling callback in event loop of running application.
 
-        for i, c in enumerate(choices):
-            name = c['name']
-            issue = c.get('issue', name)
-            disabled = c.get('disabled', None)
+    It is safe to call it from other threads.
+    """
+    try:
+        # prompt_toolkit 2 runs applications in its own event loop
+        from prompt_toolkit.eventloop import call_from_executor
+        return call_from_executor
+    except ImportError:
+        return asyncio.get_event_loop().call_soon_threadsafe
 
-            # set pointer on the first available choice
-            if pointer_not_set and not disabled:
-                self.pointer_index = i
-                pointer_not_set = False
 
-            self.choices.append((name, issue, disabled))
+STYLE = Style.from_dict({
+    'separator': '#6C6C6C',
+    'qmark': '#FF9D00 bold',
+    'sel_issue': 'fg:#5Fff9D bg: bold',
+    'pointer': '#FF9D00 bold',
+    'answer': '#5F819D bold',
+    'default': '',
+})
 
 
-def select_issue(choices, pointer_index, msg):
-    controller = IssuesController(message='choose issues', choices=choices,
-                                  pointer_index=pointer_index)
+def create_application(controller, msg, get_status=None, choose_pointed=False):
     if msg is None:
         msg = "Choose issues:"
 
@@ -232,7 +362,7 @@ def select_issue(choices, pointer_index, msg):
 
         return prompt
 
-    layout = Layout(HSplit([
+    windows = [
         Window(height=D.exact(1),
                content=FormattedTextControl(get_prompt(), show_cursor=False)),
         ConditionalContainer(
@@ -244,70 +374,107 @@ def select_issue(choices, pointer_index, msg):
             ),
             filter=~IsDone()
         )
-    ]))
+    ]
+
+    def get_footer():
+        footer = []
+        if controller.filtering or controller.filter_text:
+            footer.append(('class:qmark', '/'))
+            footer.append(('class:default', controller.filter_text))
+        if get_status is not None:
+            if footer:
+                footer.append(('class:default', '  '))
+            footer.extend(get_status())
+        return footer
+
+    windows.append(ConditionalContainer(
+        Window(height=D.exact(1),
+               content=FormattedTextControl(get_footer, show_cursor=False)),
+        filter=~IsDone() & Condition(lambda: bool(get_footer()))
+    ))
+
+    layout = Layout(HSplit(windows))
 
     bindings = KeyBindings()
+    filtering = Condition(lambda: controller.filtering)
 
     @bindings.add(Keys.ControlQ, eager=True)
     @bindings.add(Keys.ControlC, eager=True)
     def exit(event):
         event.app.exit(result=[])
 
-    @bindings.add(' ', eager=True)
+    # prompt_toolkit 3 delivers SIGINT (e.g. from gfl daemon) as key press
+    if hasattr(Keys, 'SIGINT'):
+        @bindings.add(Keys.SIGINT, eager=True)
+        def interrupt(event):
+            event.app.exit(exception=KeyboardInterrupt)
+
+    @bindings.add(' ', eager=True, filter=~filtering)
     def toggle(event):
+        if not controller.line_count:
+            return
         controller.toggle(controller.pointer_index)
         event.app.invalidate()
 
-    @bindings.add('j', eager=True)
+    @bindings.add('j', eager=True, filter=~filtering)
     @bindings.add(Keys.Down, eager=True)
     def move_cursor_down(event):
-        def _next():
-            controller.pointer_index = ((controller.pointer_index + 1) % controller.line_count)
-            event.app.invalidate()
-        _next()
-        while controller.choices[controller.pointer_index][2]:
-            _next()
+        controller.move_down()
+        event.app.invalidate()
 
     @bindings.add(Keys.Up, eager=True)
-    @bindings.add('k', eager=True)
+    @bindings.add('k', eager=True, filter=~filtering)
     def move_cursor_up(event):
-        def _prev():
-            controller.pointer_index = ((controller.pointer_index - 1) % controller.line_count)
+        controller.move_up()
+        event.app.invalidate()
+
+    @bindings.add('/', eager=True, filter=~filtering)
+    def start_filtering(event):
+        controller.filtering = True
+        event.app.invalidate()
+
+    @bindings.add(Keys.Any, filter=filtering)
+    def type_filter(event):
+        if event.data.isprintable():
+            controller.set_filter(controller.filter_text + event.data)
             event.app.invalidate()
-        _prev()
-        while controller.choices[controller.pointer_index][2]:
-            _prev()
 
-    @bindings.add(Keys.Enter, eager=True)
+    @bindings.add(Keys.Backspace, eager=True, filter=filtering)
+    def delete_filter_character(event):
+        if controller.filter_text:
+            controller.set_filter(controller.filter_text[:-1])
+        else:
+            controller.filtering = False
+        event.app.invalidate()
+
+    @bindings.add(Keys.Escape, eager=True, filter=filtering)
+    def clear_filter(event):
+        controller.set_filter('')
+        controller.filtering = False
+        event.app.invalidate()
+
+    @bindings.add(Keys.Enter, eager=True, filter=filtering)
+    def stop_filtering(event):
+        controller.filtering = False
+        event.app.invalidate()
+
+    @bindings.add(Keys.Enter, eager=True, filter=~filtering)
     def set_answer(event):
+        selected = list(controller.selected)
+        if not selected and choose_pointed:
+            if controller.pointed_issue is None:
+                return
+            selected = [controller.pointed_issue]
         controller.answered = True
-        event.app.exit(result=controller.selected)
-
-    style = Style.from_dict({
-        'separator': '#6C6C6C',
-        'qmark': '#FF9D00 bold',
-        'sel_issue': 'fg:#5Fff9D bg: bold',
-        'pointer': '#FF9D00 bold',
-        'answer': '#5F819D bold',
-        'default': '',
-    })
-
-    app = Application(
+        event.app.exit(result=selected)
+
+    return Application(
             layout=layout,
             key_bindings=bindings,
             mouse_support=True,
-            style=style,
+            style=STYLE,
     )
 
-    if controller.has_active_choices():
-        result = app.run()
-        return result
-    else:
-        print_formatted_text(
-            FormattedText(controller.get_formatted_choices()),
-            style=style)
-        return []
-
 
 def convert_stories_to_choices(stories, filter_function):
     choices = []
@@ -315,7 +482,9 @@ def convert_stories_to_choices(stories, filter_function):
     def append(issue):
         choice = {
             'name': issue.summary,
-            'issue': issue
+            'issue': issue,
+            # Matched by the picker filter
+            'search': ('%s %s' % (issue.key, issue.summary)).lower()
         }
         if not filter_function(issue):
             choice['disabled'] = True
@@ -7,6 +7,12 @@ BASE_DIRECTORY = os.path.expanduser('~') + '/.config/gfl/'
 DATA_DIR = os.path.join(BASE_DIRECTORY, 'data')
 CONFIG_FILE = BASE_DIRECTORY + 'config.json'
 
+# Time to live of cached JIRA metadata, in seconds
+DEFAULT_CACHE_TTL = {
+    'transitions': 24 * 60 * 60,
+    'createmeta': 24 * 60 * 60,
+}
+
 
 config = {
     'badges': {
@@ -28,20 +34,61 @@ config = {
         }
     },
     'max_results': 100,
-    'create_pull_request': True
+    'create_pull_request': True,
+    'storage': 'json',
+    'concurrency': 4,
+    'cache_ttl': DEFAULT_CACHE_TTL,
+    'auto_sync': False,
+    'offline': False,
+    'outbox_retries': 3,
+    'timeout': 10
 }
 
-if not os.path.exists(BASE_DIRECTORY):
-    os.makedirs(BASE_DIRECTORY)
+# Modification time of the configuration file when it was loaded
+_mtime = None
+
+
+def load():
+    """Read configuration file, creating it with defaults if it is missing."""
+    global config, _mtime
+    global BADGES, CREATE_PULL_REQUEST, MAX_RESULTS, STORAGE, CONCURRENCY
+    global CACHE_TTL, AUTO_SYNC, OFFLINE, OUTBOX_RETRIES, TIMEOUT
+
+    if not os.path.exists(BASE_DIRECTORY):
+        os.makedirs(BASE_DIRECTORY)
+
+    if os.path.exists(CONFIG_FILE):
+        with open(CONFIG_FILE, 'r') as f:
+            config = json.load(f)
+    else:
+        with open(CONFIG_FILE, 'w+') as f:
+            json.dump(config, f, indent=4)
+    _mtime = os.stat(CONFIG_FILE).st_mtime_ns
+
+    BADGES = config['badges']
+    CREATE_PULL_REQUEST = config['create_pull_request']
+    MAX_RESULTS = config['max_results']
+    # Repositories storage engine: 'json' (TinyDB files) or 'sqlite'
+    STORAGE = config.get('storage', 'json')
+    # Number of issues processed concurrently by workflow actions
+    CONCURRENCY = config.get('concurrency', 4)
+    CACHE_TTL = {**DEFAULT_CACHE_TTL, **config.get('cache_ttl', {})}
+    # Sync issues changed in Jira before showing work status
+    AUTO_SYNC = config.get('auto_sync', False)
+    # Queue Jira changes of workflow actions in outbox instead of sending them
+    OFFLINE = config.get('offline', False)
+    # Attempts to send outbox entry when JIRA is unreachable
+    OUTBOX_RETRIES = config.get('outbox_retries', 3)
+    # Seconds to wait for JIRA response
+    TIMEOUT = config.get('timeout', 10)
+
 
-if os.path.exists(CONFIG_FILE):
-    with open(CONFIG_FILE, 'r') as f:
-        config = json.load(f)
-else:
-    with open(CONFIG_FILE, 'w+') as f:
-        json.dump(config, f, indent=4)
+def changed():
+    """Whether configuration file was modified since it was loaded."""
+    try:
+        return os.stat(CONFIG_FILE).st_mtime_ns != _mtime
+    except FileNotFoundError:
+        return True
 
 
-BADGES = config['badges']
-CREATE_PULL_REQUEST = config['create_pull_request']
-MAX_RESULTS = config['max_results']
+load()
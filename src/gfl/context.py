@@ -0,0 +1,115 @@
+"""
+Lazily initialized application context.
+
+Modules are imported inside the factories, so a command imports only the
+models (and their dependencies) it actually uses.
+"""
+
+
+class lazy:
+    """Property computed on first access and stored on the instance."""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.name = factory.__name__
+        self.__doc__ = factory.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = self.factory(instance)
+        instance.__dict__[self.name] = value
+        return value
+
+
+class Context:
+    """
+    Application context.
+
+    Repositories, current workspace and CLI helpers are created on first use,
+    so every command pays only for what it touches.
+    """
+
+    @lazy
+    def credentials_repository(self):
+        from gfl.credentials import CredentialsRepository
+
+        return CredentialsRepository()
+
+    @lazy
+    def instance_repository(self):
+        from gfl.instances import InstanceRepository
+
+        return InstanceRepository()
+
+    @lazy
+    def workflow_repository(self):
+        from gfl.workflow import WorkflowRepository
+
+        return WorkflowRepository()
+
+    @lazy
+    def issue_repository(self):
+        from gfl.issues import IssueRepository
+
+        return IssueRepository()
+
+    @lazy
+    def project_repository(self):
+        from gfl.projects import ProjectRepository
+
+        return ProjectRepository()
+
+    @lazy
+    def workspace_repository(self):
+        from gfl.workspaces import WorkspaceRepository
+
+        return WorkspaceRepository()
+
+    @lazy
+    def outbox(self):
+        from gfl.outbox import Outbox
+
+        return Outbox()
+
+    @lazy
+    def workspace(self):
+        return self.workspace_repository.get_current_workspace()
+
+    @lazy
+    def credentials_cli(self):
+        from gfl.credentials import CredentialsCLI
+
+        return CredentialsCLI(self.credentials_repository)
+
+    @lazy
+    def instances_cli(self):
+        from gfl.instances import InstanceCLI
+
+        return InstanceCLI(self.instance_repository, self.credentials_repository)
+
+    @lazy
+    def workflow_cli(self):
+        from gfl.workflow import WorkflowCLI
+
+        return WorkflowCLI(self.workflow_repository)
+
+    @lazy
+    def issues_cli(self):
+        from gfl.issues import IssuesCLI
+
+        return IssuesCLI(self.issue_repository, self.workspace)
+
+    @lazy
+    def projects_cli(self):
+        from gfl.projects import ProjectCLI
+
+        return ProjectCLI(
+            self.project_repository, self.instance_repository, self.workflow_repository
+        )
+
+    @lazy
+    def workspace_cli(self):
+        from gfl.workspaces import WorkspaceCLI
+
+        return WorkspaceCLI(self.workspace_repository, self.project_repository)
@@ -1,10 +1,6 @@
-import os
 from marshmallow import Schema, fields, post_load
-from prompt_toolkit import prompt, print_formatted_text, HTML
 
-from gfl.cli import print_simple_collection
 from gfl.db import EntityRepository, ForeignEntity
-from gfl.validators import UniqueID
 
 
 class Credentials:
@@ -21,7 +17,7 @@ class CredentialsRepository(EntityRepository):
     """Credentials repository"""
 
     def __init__(self):
-        super().__init__(Credentials, CredentialsSchema(), "credentials.json")
+        super().__init__(Credentials, CredentialsSchema(), "credentials")
 
 
 class CredentialsEntity(ForeignEntity):
@@ -44,6 +40,9 @@ class CredentialsCLI:
         self.repository = repository
 
     def new(self):
+        from prompt_toolkit import prompt
+        from gfl.validators import UniqueID
+
         id = prompt(
             "Credentials ID: ", validator=UniqueID("Credentials", self.repository)
         )
@@ -56,6 +55,8 @@ class CredentialsCLI:
 
     def list(self):
         """List all credentials."""
+        from gfl.cli import print_simple_collection
+
         print_simple_collection(
             CredentialsSchema(), self.repository.all(), "id", exclude=["token"]
         )
@@ -0,0 +1,340 @@
+"""
+Background daemon serving gfl commands.
+
+Daemon keeps modules imported, JSON tables loaded and JIRA clients created,
+so commands do not pay for them. Tables changed by commands are reloaded
+when the commands finish, and everything is reloaded when configuration
+file changes. Client sends command line arguments, working directory and
+environment together with its standard streams (file descriptors passed
+over Unix socket), so commands, including interactive ones, run as if
+they were run in client process. Each command runs in a process forked
+from the daemon, so commands run side by side and none of them affects
+the daemon. Command is interrupted when its client goes away (e.g. on
+Ctrl-C).
+"""
+import array
+import json
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from gfl import config
+
+SOCKET_PATH = os.path.join(config.BASE_DIRECTORY, "daemon.sock")
+LOG_FILE = os.path.join(config.BASE_DIRECTORY, "daemon.log")
+
+STD_FDS = [0, 1, 2]
+
+# Time for interrupted command to finish before it is killed, in seconds
+INTERRUPT_TIMEOUT = 5
+# How often finished commands are collected, in seconds
+REAP_INTERVAL = 1
+
+RUN = "run"
+PING = "ping"
+STOP = "stop"
+
+
+def is_supported():
+    return hasattr(socket, "AF_UNIX") and hasattr(socket, "SCM_RIGHTS")
+
+
+def _connect():
+    if not is_supported() or not os.path.exists(SOCKET_PATH):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(SOCKET_PATH)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def _send(sock, message, fds=()):
+    # Messages are single lines, connection stays open in both directions
+    data = json.dumps(message).encode("utf-8") + b"\n"
+    ancillary = []
+    if fds:
+        ancillary = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", fds))]
+    sent = sock.sendmsg([data], ancillary)
+    if sent < len(data):
+        sock.sendall(data[sent:])
+
+
+def _receive(sock):
+    chunks = []
+    fds = array.array("i")
+    ancillary_size = socket.CMSG_LEN(len(STD_FDS) * fds.itemsize)
+    data, ancdata, _, _ = sock.recvmsg(65536, ancillary_size)
+    for level, type, cmsg_data in ancdata:
+        if level == socket.SOL_SOCKET and type == socket.SCM_RIGHTS:
+            size = len(cmsg_data) - len(cmsg_data) % fds.itemsize
+            fds.frombytes(cmsg_data[:size])
+
+    while data:
+        chunks.append(data)
+        if data.endswith(b"\n"):
+            break
+        data = sock.recv(65536)
+
+    message = json.loads(b"".join(chunks).decode("utf-8")) if chunks else None
+    return message, list(fds)
+
+
+def request(message, fds=()):
+    """Send request to running daemon. Return response or None if not running."""
+    sock = _connect()
+    if sock is None:
+        return None
+
+    with sock:
+        _send(sock, message, fds)
+        response, _ = _receive(sock)
+
+    if response is None:
+        raise RuntimeError("gfl daemon closed connection without response")
+    return response
+
+
+def forward(args):
+    """
+    Run command in daemon, if it is running.
+
+    Return command exit code or None if command has to be run in process.
+    """
+    message = {
+        "type": RUN,
+        "args": args,
+        "cwd": os.getcwd(),
+        "env": dict(os.environ),
+    }
+    try:
+        response = request(message, STD_FDS)
+    except KeyboardInterrupt:
+        # Closed connection interrupts command in daemon
+        return 130
+    if response is None:
+        return None
+    return response["exit_code"]
+
+
+def is_running():
+    return request({"type": PING}) is not None
+
+
+def stop():
+    return request({"type": STOP}) is not None
+
+
+def _exit_code(error):
+    if error.code is None:
+        return 0
+    if isinstance(error.code, int):
+        return error.code
+    print(error.code, file=sys.stderr)
+    return 1
+
+
+def _run(message, fds):
+    """Run command with client standard streams, directory and environment."""
+    from gfl import gfl
+
+    for fd, std_fd in zip(fds, STD_FDS):
+        os.dup2(fd, std_fd)
+    os.chdir(message["cwd"])
+    os.environ.clear()
+    os.environ.update(message["env"])
+
+    try:
+        gfl.main(args=message["args"], prog_name="gfl")
+        return 0
+    except SystemExit as e:
+        return _exit_code(e)
+    except Exception:
+        traceback.print_exc()
+        return 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+
+def _interrupt_when_closed(connection):
+    """Interrupt command when client closes connection before the response."""
+    try:
+        connection.recv(1)
+    except OSError:
+        pass
+    os.kill(os.getpid(), signal.SIGINT)
+    time.sleep(INTERRUPT_TIMEOUT)
+    os._exit(130)
+
+
+def _serve_command(server, connection, message, fds):
+    """Run command in forked process. Return in the daemon only."""
+    if os.fork():
+        return
+
+    exit_code = 1
+    try:
+        server.close()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        threading.Thread(
+            target=_interrupt_when_closed, args=(connection,), daemon=True
+        ).start()
+        exit_code = _run(message, fds)
+        # Client closes connection as soon as it has the response
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        _send(connection, {"exit_code": exit_code})
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        os._exit(exit_code)
+
+
+def _handle(server, connection):
+    """Serve single request. Return False if daemon should stop."""
+    message, fds = _receive(connection)
+    try:
+        if message is None:
+            return True
+        if message["type"] == STOP:
+            _send(connection, {"stopped": True})
+            return False
+        if message["type"] == PING:
+            _send(connection, {"pid": os.getpid()})
+            return True
+
+        if config.changed():
+            _reload_config()
+        _serve_command(server, connection, message, fds)
+        return True
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+
+def _reap():
+    """Collect finished command processes. Return their count."""
+    count = 0
+    try:
+        while os.waitpid(-1, os.WNOHANG)[0]:
+            count += 1
+    except ChildProcessError:
+        pass
+    return count
+
+
+def _preload():
+    """Import modules used by commands, so forked processes start warm."""
+    import gfl.cli  # noqa: F401
+    import gfl.issues  # noqa: F401
+    import gfl.jira  # noqa: F401
+    import gfl.workspaces  # noqa: F401
+    import questionary  # noqa: F401
+
+
+def _warm_up():
+    """
+    Load state inherited by forked commands.
+
+    JSON tables are read (again, if commands changed them) and JIRA clients
+    of all instances are created. Clients are never used by the daemon, so
+    commands do not share their HTTP connections.
+    """
+    from gfl import jira, storage
+    from gfl.cache import Cache
+    from gfl.credentials import CredentialsRepository
+    from gfl.db import identity_map, session
+    from gfl.instances import InstanceRepository
+    from gfl.issues import IssueRepository
+    from gfl.outbox import Outbox
+    from gfl.projects import ProjectRepository
+    from gfl.workflow import WorkflowRepository
+    from gfl.workspaces import WorkspaceRepository
+
+    try:
+        with session():
+            repositories = [
+                CredentialsRepository(),
+                WorkflowRepository(),
+                ProjectRepository(),
+                WorkspaceRepository(),
+                IssueRepository(),
+                Cache(),
+                Outbox(),
+            ]
+            for repository in repositories:
+                repository.db.all()
+            for instance in InstanceRepository().all():
+                jira.get_client(instance, instance.get_connection_user())
+    except Exception:
+        traceback.print_exc()
+    finally:
+        identity_map.clear()
+        if config.STORAGE == storage.SQLITE:
+            # SQLite connection must not be used by forked processes
+            storage.reset()
+
+
+def _reload_config():
+    """Apply changed configuration, dropping state loaded with the old one."""
+    from gfl import jira, storage
+
+    config.load()
+    storage.reset()
+    jira.reset_clients()
+    _warm_up()
+
+
+def serve():
+    """Serve requests until stopped."""
+    if os.path.exists(SOCKET_PATH):
+        os.unlink(SOCKET_PATH)
+
+    _preload()
+    _warm_up()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(SOCKET_PATH)
+        os.chmod(SOCKET_PATH, 0o600)
+        server.listen()
+
+        running = True
+        while running:
+            if _reap():
+                # Reload what finished commands changed before the next one
+                _warm_up()
+            if not select.select([server], [], [], REAP_INTERVAL)[0]:
+                continue
+
+            connection, _ = server.accept()
+            with connection:
+                try:
+                    running = _handle(server, connection)
+                except OSError:
+                    traceback.print_exc()
+    finally:
+        server.close()
+        if os.path.exists(SOCKET_PATH):
+            os.unlink(SOCKET_PATH)
+
+
+def detach():
+    """Fork to background. Return True in the daemon process."""
+    if os.fork():
+        return False
+
+    os.setsid()
+    with open(os.devnull, "r") as devnull:
+        os.dup2(devnull.fileno(), 0)
+    with open(LOG_FILE, "a") as log:
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+    return True
@@ -1,16 +1,49 @@
-import os
-import json
+from contextlib import contextmanager
 
 from marshmallow import fields
-from tinydb import TinyDB, Query
 
-from gfl import config
+from gfl.storage import buffered_writes, get_table
 
 
 class EntityNotFound(Exception):
     pass
 
 
+class IdentityMap:
+    """Entities materialized in the current session, keyed by type and ID."""
+
+    def __init__(self):
+        self.entities = {}
+
+    def get(self, model, id):
+        return self.entities.get((model, id))
+
+    def add(self, model, id, entity):
+        self.entities[(model, id)] = entity
+
+    def remove(self, model, id):
+        self.entities.pop((model, id), None)
+
+    def clear(self):
+        self.entities.clear()
+
+
+identity_map = IdentityMap()
+
+
+@contextmanager
+def session():
+    """
+    Unit of work of a single command.
+
+    Entities are materialized once within the session, and writes are kept
+    in memory and flushed once per touched table when the session ends.
+    """
+    identity_map.clear()
+    with buffered_writes():
+        yield
+
+
 class ForeignEntity(fields.Field):
     def _serialize(self, value, attr, obj, **kwargs):
         return value.id
@@ -25,8 +58,11 @@ class ForeignEntity(fields.Field):
 
 
 class Repository:
-    def __init__(self, model, schema, path):
-        self.db = TinyDB(os.path.join(config.DATA_DIR, path))
+    # Field identifying entity in storage and in the identity map
+    identity = "id"
+
+    def __init__(self, model, schema, name):
+        self.db = get_table(name, self.identity)
         self.schema = schema
         self.model = model
 
@@ -34,27 +70,46 @@ class Repository:
         self.db.insert(self.schema.dump(model))
 
     def all(self):
-        return [self.schema.load(entity) for entity in self.db.all()]
+        return [self.load(entity) for entity in self.db.all()]
+
+    def load(self, document):
+        """Deserialize document, reusing entity already loaded in this session."""
+        id = document[self.identity]
+        entity = identity_map.get(self.model, id)
+        if entity is None:
+            entity = self.schema.load(document)
+            identity_map.add(self.model, id, entity)
+        return entity
+
+    def forget(self, model):
+        self.forget_key(getattr(model, self.identity))
+
+    def forget_key(self, id):
+        identity_map.remove(self.model, id)
 
 
 class EntityRepository(Repository):
     def update(self, model):
         serialized = self.schema.dump(model)
-        self.db.update(serialized, Query().id == model.id)
+        self.db.update(serialized)
+        self.forget(model)
 
     def remove(self, model):
-        self.db.remove(Query().id == model.id)
+        self.db.remove(model.id)
+        self.forget(model)
 
     def ids(self):
-        return [entity.id for entity in self.all()]
+        return [entity["id"] for entity in self.db.all()]
 
     def exists(self, id):
-        Entity = Query()
-        return bool(self.db.search(Entity.id.matches(id)))
+        return self.db.find(id) is not None
 
     def find_by_id(self, id):
-        Entity = Query()
-        try:
-            return self.schema.load(self.db.search(Entity.id == id)[0])
-        except IndexError:
+        entity = identity_map.get(self.model, id)
+        if entity is not None:
+            return entity
+
+        document = self.db.find(id)
+        if document is None:
             raise EntityNotFound(f"Entity not found, ID: {id}")
+        return self.load(document)
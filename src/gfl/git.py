@@ -1,10 +1,6 @@
 """Git related functionality."""
-import re
-import webbrowser
-from urllib.parse import quote_plus
-
 import click
-from subprocess import check_output
+from subprocess import CalledProcessError, STDOUT, check_output
 
 
 def checkout(branch):
@@ -26,7 +22,70 @@ def push(branch, remote="origin"):
     check_output(["git", "push", "-u", remote, branch])
 
 
-def branch_exists(branch_name):
-    """Check if branch exists eiither local or remote"""
-    branches = check_output(["git", "branch", "-a"]).decode("utf-8").split("\n")
-    return bool([branch for branch in branches if branch_name in branch])
+def push_all(branches, remote="origin", set_upstream=True):
+    """
+    Push branches with single git call.
+
+    Return dict of branch name to error message, None if branch was pushed.
+    """
+    upstream = ["-u"] if set_upstream else []
+    try:
+        output = check_output(
+            ["git", "push", "--porcelain", *upstream, remote, *branches],
+            stderr=STDOUT,
+        )
+    except CalledProcessError as e:
+        output = e.output
+
+    lines = output.decode("utf-8").splitlines()
+    # Reported when git does not get to pushing refs, e.g. remote is unreachable
+    errors = [line for line in lines if line.startswith(("fatal:", "error:"))]
+    results = dict.fromkeys(branches, errors[0] if errors else "Not pushed")
+
+    # Ref lines are "<flag>\t<from>:<to>\t<summary>", "!" flags rejected ref
+    for line in lines:
+        flag, _, ref_status = line.partition("\t")
+        if len(flag) != 1 or not ref_status:
+            continue
+        refs, _, summary = ref_status.partition("\t")
+        branch = refs.split(":")[0].replace("refs/heads/", "", 1)
+        if branch in results:
+            results[branch] = summary if flag == "!" else None
+    return results
+
+
+def set_upstream(branch, remote="origin"):
+    """Track pushed branch. Return error message, None on success."""
+    try:
+        check_output(
+            ["git", "branch", f"--set-upstream-to={remote}/{branch}", branch],
+            stderr=STDOUT,
+        )
+    except CalledProcessError as e:
+        return "upstream not set: " + e.output.decode("utf-8").strip()
+    return None
+
+
+def branch_exists(branch_name, remote="origin"):
+    """Check if branch exists either local or remote"""
+    return branch_name in existing_branches([branch_name], remote)
+
+
+def existing_branches(branch_names, remote="origin"):
+    """
+    Return names of branches which exist either local or remote.
+
+    Only local branches are looked up if remote is None. All names are looked
+    up with one git call, listing only matching refs.
+    """
+    refs = {}
+    for name in branch_names:
+        refs[f"refs/heads/{name}"] = name
+        if remote is not None:
+            refs[f"refs/remotes/{remote}/{name}"] = name
+    if not refs:
+        return set()
+
+    # Patterns match also refs below them (e.g. refs/heads/<name>/...)
+    output = check_output(["git", "for-each-ref", "--format=%(refname)", *refs])
+    return {refs[ref] for ref in output.decode("utf-8").split("\n") if ref in refs}
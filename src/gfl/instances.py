@@ -1,15 +1,7 @@
-import os
-import questionary
 from marshmallow import Schema, fields, post_load
-from prompt_toolkit import prompt
-from prompt_toolkit.completion.word_completer import WordCompleter
-from tinydb import TinyDB, Query
 
 from gfl.db import EntityRepository, ForeignEntity
-from gfl.cli import print_simple_collection
-from gfl.jira import Jira
-from gfl.validators import UniqueID, ExistenceValidator
-from gfl.credentials import CredentialsSchema, CredentialsEntity
+from gfl.credentials import CredentialsEntity
 
 JIRA_SERVER = "server"
 JIRA_CLOUD = "cloud"
@@ -23,6 +15,8 @@ class Instance:
         self.type = type
 
     def connect(self, project, workflow):
+        from gfl.jira import Jira
+
         connection_user = self.get_connection_user()
         return Jira(self, project, workflow, connection_user)
 
@@ -48,7 +42,7 @@ class InstanceSchema(Schema):
 
 class InstanceRepository(EntityRepository):
     def __init__(self):
-        super().__init__(Instance, InstanceSchema(), "instances.json")
+        super().__init__(Instance, InstanceSchema(), "instances")
 
 
 class InstanceEntity(ForeignEntity):
@@ -61,6 +55,10 @@ class InstanceCLI:
         self.credentials = credentials_repository
 
     def new(self):
+        import questionary
+        from prompt_toolkit import prompt
+        from gfl.validators import UniqueID
+
         validator = UniqueID("Instance", self.instances)
         id = prompt("Instance ID: ", validator=validator)
         url = prompt("Instance URL: ")
@@ -79,4 +77,6 @@ class InstanceCLI:
 
     def list(self):
         """List all instances."""
+        from gfl.cli import print_simple_collection
+
         print_simple_collection(InstanceSchema(), self.instances.all(), "id")
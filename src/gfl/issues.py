@@ -1,15 +1,7 @@
-import questionary
-
 from marshmallow import Schema, fields, post_load
-from prompt_toolkit import prompt
-from tinydb import Query
 
 from gfl.db import Repository
-from gfl.cli import (
-    get_pointer_index,
-    convert_stories_to_choices,
-    select_issue,
-)
+from gfl.storage import get_table
 from gfl import types
 
 
@@ -20,27 +12,73 @@ class CLIError:
 class Issue:
     """Jira simplified issue"""
 
+    __slots__ = ("key", "summary", "type", "status", "_subtasks", "workspace")
+
     def __init__(self, key, summary, type, status):
         self.key = key
         self.summary = summary
         self.type = type
         self.status = status
         self.subtasks = []
-        self.full_name = self.__repr__()
         self.workspace = None
 
+    @property
+    def subtasks(self):
+        return self._subtasks
+
+    @subtasks.setter
+    def subtasks(self, subtasks):
+        self._subtasks = Subtasks(subtasks)
+
+    @property
+    def full_name(self):
+        return self.__repr__()
+
     def __hash__(self):
-        return self.key.split("-")[1]
+        return hash(self.key)
 
     def __eq__(self, obj):
+        if not isinstance(obj, Issue):
+            return NotImplemented
         return self.key == obj.key
 
     def __repr__(self):
         return "{}: {}".format(self.key, self.summary)
 
     def add_subtask(self, subtask):
-        if subtask not in self.subtasks:
-            self.subtasks.append(subtask)
+        self.subtasks.add(subtask)
+
+
+class Subtasks:
+    """Subtasks of an issue, in order they were added, unique by key."""
+
+    __slots__ = ("_issues",)
+
+    def __init__(self, issues=()):
+        self._issues = {}
+        for issue in issues:
+            self.add(issue)
+
+    def add(self, issue):
+        self._issues.setdefault(issue.key, issue)
+
+    def get(self, key):
+        return self._issues.get(key)
+
+    def remove(self, issue):
+        self._issues.pop(issue.key, None)
+
+    def __contains__(self, issue):
+        return issue.key in self._issues
+
+    def __iter__(self):
+        return iter(self._issues.values())
+
+    def __len__(self):
+        return len(self._issues)
+
+    def __repr__(self):
+        return repr(list(self))
 
 
 class IssueSchema(Schema):
@@ -60,35 +98,128 @@ class IssueSchema(Schema):
 
 
 class IssueRepository(Repository):
+    identity = "key"
+
+    # Marks parents table as built from stored issues
+    PARENTS_BUILT = "*"
+
     def __init__(self):
-        super().__init__(Issue, IssueSchema(), "issues.json")
+        super().__init__(Issue, IssueSchema(), "issues")
+        # Subtask key -> key of stored issue containing it
+        self.parents = get_table("issue_parents", "key")
+        self._parents_checked = False
+
+    def _find_parent(self, key):
+        if not self._parents_checked:
+            if self.parents.find(self.PARENTS_BUILT) is None:
+                for document in self.db.all():
+                    self._link(document)
+                self.parents.upsert({"key": self.PARENTS_BUILT, "parent": None})
+            self._parents_checked = True
+
+        link = self.parents.find(key)
+        return link["parent"] if link else None
+
+    def _link(self, document, previous=None):
+        """Keep parents table in line with document replacing previous one."""
+        keys = [subtask["key"] for subtask in document["subtasks"]]
+        if previous is not None:
+            linked = {subtask["key"] for subtask in previous["subtasks"]}
+            for key in linked.difference(keys):
+                self.parents.remove(key)
+            keys = [key for key in keys if key not in linked]
+        for key in keys:
+            self.parents.upsert({"key": key, "parent": document["key"]})
+
+    def _unlink(self, document):
+        for subtask in document["subtasks"]:
+            self.parents.remove(subtask["key"])
+
+    def _find_stored(self, key):
+        """Return stored document containing issue (or subtask) with key."""
+        document = self.db.find(key)
+        if document is None:
+            parent_key = self._find_parent(key)
+            if parent_key is not None:
+                document = self.db.find(parent_key)
+        return document
+
+    def save(self, issue):
+        super().save(issue)
+        self._link(self.schema.dump(issue))
 
     def find_by_key(self, key):
-        for story in self.all():
-            if story.key == key:
-                return story
+        document = self._find_stored(key)
+        if document is None:
+            return None
 
-            for subtask in story.subtasks:
-                if subtask.key == key:
-                    return subtask
+        issue = self.load(document)
+        if issue.key == key:
+            return issue
+        return issue.subtasks.get(key)
 
     def update(self, issue):
-        """Update issue in database. If issue not found search for subtasks."""
-        try:
-            self.db.search(Query().key == issue.key)[0]
-            self.db.update(self.schema.dump(issue), Query().key == issue.key)
-        except IndexError:
-            for issue_in_db in self.all():
-                try:
-                    i = issue_in_db.subtasks.index(issue)
-                    issue_in_db.subtasks[i] = issue
-                    self.update(issue_in_db)
-                except ValueError:
-                    pass
+        """Update issue in database. Subtasks are updated within their story."""
+        document = self._find_stored(issue.key)
+        if document is None:
+            return
 
+        if document["key"] == issue.key:
+            updated = self.schema.dump(issue)
+        else:
+            serialized = self.schema.dump(issue)
+            updated = dict(document)
+            updated["subtasks"] = [
+                serialized if subtask["key"] == issue.key else subtask
+                for subtask in document["subtasks"]
+            ]
+
+        self.db.update(updated)
+        self._link(updated, document)
+        self.forget_key(document["key"])
+
+    def stored_keys(self):
+        """Keys of stored stories and issues, without subtasks."""
+        return [document["key"] for document in self.db.all()]
+
+    def sync(self, remote_issues):
+        """Replace stored issues, along with their subtasks, with remote ones."""
+        for issue in remote_issues:
+            document = self.db.find(issue.key)
+            if document is None:
+                continue
+
+            updated = self.schema.dump(issue)
+            self.db.update(updated)
+            self._link(updated, document)
+            self.forget(issue)
+
+    def sync_subtask(self, parent_key, subtask):
+        """Replace stored subtask with remote one, or add it to stored parent."""
+        document = self.db.find(parent_key)
+        if document is None:
+            return
+
+        subtasks = list(document["subtasks"])
+        serialized = self.schema.dump(subtask)
+        for position, stored in enumerate(subtasks):
+            if stored["key"] == subtask.key:
+                subtasks[position] = serialized
+                break
+        else:
+            subtasks.append(serialized)
+
+        updated = dict(document, subtasks=subtasks)
+        self.db.update(updated)
+        self._link(updated, document)
+        self.forget_key(parent_key)
 
     def remove(self, issue):
-        self.db.remove(Query().key == issue.key)
+        document = self.db.find(issue.key)
+        self.db.remove(issue.key)
+        if document is not None:
+            self._unlink(document)
+        self.forget(issue)
 
 
 class IssuesCLI:
@@ -113,6 +244,8 @@ class IssuesCLI:
     def choose_interactive(
         self, filter_function=lambda issue: True, show_only=False, msg=None
     ):
+        from gfl.cli import get_pointer_index, convert_stories_to_choices, select_issue
+
         issues = self.repository.all()
 
         if not issues:
@@ -135,17 +268,15 @@ class IssuesCLI:
 
         return selected
 
-    def choose_issues_from_simple_view(self, issues):
-        if not issues:
-            exit("No issues.")
-        print("Matching issues")
-        for idx, issue in enumerate(issues):
-            issue_model = Issue.from_jira(issue)
-            print("{}: {} {}".format(idx, issue_model.key, issue_model.summary))
-        issue_id = int(questionary.text("Choose issue").ask())
-        return issues[issue_id]
+    def choose_from_search(self, pages):
+        """Choose issue from search results streamed page by page."""
+        from gfl.cli import select_issue_from_pages
+
+        return select_issue_from_pages(pages, msg="Choose issue:")
 
     def new(self, type):
+        from prompt_toolkit import prompt
+
         issue = {}
 
         is_subtask = type == types.SUBTASK
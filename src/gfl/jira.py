@@ -1,48 +1,137 @@
+import re
+import threading
+
 import click
 from jira import JIRA, JIRAError
 
+from gfl import cache
+from gfl import config
 from gfl.issues import Issue
+from gfl.instances import JIRA_CLOUD
+
+# JIRA clients connected in this process, by server and credentials
+_clients = {}
+
+ISSUE_KEY = re.compile(r"^[A-Za-z][A-Za-z0-9_]*-\d+$")
+# Characters with special meaning in text search (Lucene query syntax)
+TEXT_RESERVED = re.compile(r'([+\-&|!(){}\[\]^~*?:\\/"])')
+
+# Fields read when converting JIRA issue, others are not fetched
+ISSUE_FIELDS = "summary,issuetype,status,subtasks"
+# Fields needed to find transitions of an issue
+TRANSITION_FIELDS = "issuetype,status"
+
+# Seconds to wait for connection to JIRA, unreachable JIRA fails fast
+CONNECT_TIMEOUT = 3
+
+# Issue keys per `key in (...)` query, keeps query within request URL limits
+KEYS_PER_QUERY = 100
+
+
+def get_client(instance, connection_user):
+    """
+    Get JIRA client for the instance, connecting once per process.
+
+    Reused client keeps its HTTP session with pooled keep-alive connections.
+    Server info request is skipped, deployment type is already known from the
+    instance configuration. Requests are not retried by the client, callers
+    queue or retry them (see outbox).
+    """
+    key = (instance.url, connection_user, instance.credentials.token)
+    if key not in _clients:
+        client = JIRA(
+            instance.url,
+            basic_auth=(connection_user, instance.credentials.token),
+            get_server_info=False,
+            max_retries=0,
+            timeout=(CONNECT_TIMEOUT, config.TIMEOUT),
+        )
+        client.deploymentType = "Cloud" if instance.type == JIRA_CLOUD else "Server"
+        _clients[key] = client
+    return _clients[key]
+
+
+def reset_clients():
+    """Forget connected clients, e.g. after credentials changed."""
+    _clients.clear()
 
 
 class Jira(object):
     """JIRA objects and operations."""
 
-    def __init__(self, instance, project, workflow, connection_user, max_results=50):
+    def __init__(self, instance, project, workflow, connection_user, page_size=50):
         self.workflow = workflow
         self.project = project
+        self.server = instance.url
         self.username = instance.credentials.username
-        self.max_results = max_results
-        self.jira = JIRA(
-            instance.url, basic_auth=(connection_user, instance.credentials.token)
-        )
+        self.page_size = page_size
+        self.jira = get_client(instance, connection_user)
+        self.cache = cache.Cache()
+        # Actions on multiple issues run in threads sharing the cache
+        self._cache_lock = threading.Lock()
 
     def search_issues(self, keyword, **kwargs):
+        """Search Jira issues of the project by keyword."""
+        return [
+            issue
+            for page in self.iter_search_pages(keyword, **kwargs)
+            for issue in page
+        ]
+
+    def iter_search_pages(self, keyword, types=None, limit=None):
         """
-        Search Jira issues.
+        Search Jira issues of the project, yielding lists of issues page by page.
 
-        Filtering by keyword is not done on JIRA query becasue it does not support
-        filtering both summary and key by string values.
+        Keyword is matched against summary and, if it looks like issue key,
+        against key. Types are workflow issue types.
         """
-        keyword = keyword.lower()
-        query_parameters = []
-        if kwargs.get("types"):
-            for type in kwargs.get("types"):
-                query_parameters.append('type = "{}"'.format(type))
+        clauses = ['project = "{}"'.format(quote(self.project))]
+        if types:
+            type_clauses = [
+                'type = "{}"'.format(quote(self.workflow.get_type_mapping(t) or t))
+                for t in types
+            ]
+            clauses.append("({})".format(" OR ".join(type_clauses)))
 
-        query = " OR ".join(query_parameters) + " order by created desc"
-        issues = self.jira.search_issues(query, maxResults=self.max_results)
+        keyword = keyword.strip()
+        if keyword:
+            keyword_clause = 'summary ~ "{}"'.format(quote_text(keyword))
+            if ISSUE_KEY.match(keyword):
+                keyword_clause += ' OR key = "{}"'.format(keyword.upper())
+            clauses.append("({})".format(keyword_clause))
 
-        matching_issues = []
-        for issue in issues:
-            if keyword in issue.key.lower() or keyword in issue.fields.summary.lower():
-                matching_issues.append(self._convert_to_issue(issue))
+        query = " AND ".join(clauses) + " order by created desc"
+        # Key which does not exist must not fail the whole search
+        return self.iter_pages(query, limit, validate_query=False)
 
-        return matching_issues
+    def iter_pages(self, query, limit=None, **kwargs):
+        """Yield pages of issues matching JQL query, up to limit."""
+        if limit is None:
+            limit = config.MAX_RESULTS
+
+        for page in self._iter_jira_pages(query, limit, **kwargs):
+            yield [self._convert_to_issue(jira_issue) for jira_issue in page]
+
+    def _iter_jira_pages(self, query, limit=None, **kwargs):
+        """Yield pages of JIRA issues matching JQL query, all if no limit given."""
+        kwargs.setdefault("fields", ISSUE_FIELDS)
+        start = 0
+        while limit is None or start < limit:
+            page_size = self.page_size
+            if limit is not None:
+                page_size = min(page_size, limit - start)
+            page = self.jira.search_issues(
+                query, startAt=start, maxResults=page_size, **kwargs
+            )
+            yield page
+            if len(page) < page_size:
+                return
+            start += len(page)
 
     def get_issue_by_key(self, key):
         """Get issue by key"""
         try:
-            jira_issue = self.jira.issue(key)
+            jira_issue = self.jira.issue(key, fields=ISSUE_FIELDS)
             return self._convert_to_issue(jira_issue)
 
         except JIRAError as e:
@@ -52,36 +141,146 @@ class Jira(object):
                 )
             raise
 
+    def get_issues_by_keys(self, keys):
+        """Get issues by keys with batched queries. Missing issues are skipped."""
+        issues = []
+        for chunk in key_lists(keys):
+            query = f"key in ({chunk})"
+            # Not validated, so keys of deleted issues do not fail the query
+            for page in self._iter_jira_pages(query, validate_query=False):
+                issues.extend(
+                    self._convert_to_issue(jira_issue) for jira_issue in page
+                )
+        return issues
+
+    def get_updated_issues(self, keys, minutes):
+        """
+        Get issues with given keys and their subtasks, updated in last minutes.
+
+        Return list of (parent key, issue) pairs, parent key is None for
+        issues with given keys.
+        """
+        issues = []
+        for chunk in key_lists(keys):
+            # Relative date, so server and local time zones do not matter
+            query = (
+                f"(key in ({chunk}) OR parent in ({chunk})) "
+                f'AND updated >= "-{minutes}m"'
+            )
+            pages = self._iter_jira_pages(
+                query, fields=f"{ISSUE_FIELDS},parent", validate_query=False
+            )
+            for page in pages:
+                for jira_issue in page:
+                    parent = getattr(jira_issue.fields, "parent", None)
+                    parent_key = parent.key if parent is not None else None
+                    issues.append((parent_key, self._convert_to_issue(jira_issue)))
+        return issues
+
     def create_issue(self, fields):
-        jira_issue = self.jira.create_issue(fields=fields)
-        return self._convert_to_issue(jira_issue)
+        # Created issue is fetched again with needed fields only
+        jira_issue = self.jira.create_issue(fields=fields, prefetch=False)
+        return self.get_issue_by_key(jira_issue.key)
 
-    def get_resolution_by_name(self, name):
-        resolutions = self.jira.resolutions()
-        for r in resolutions:
-            if r.name == name:
-                return r.id
-        return None
+    def _cached(self, kind, key, fetch):
+        """Get value from metadata cache, fetching and caching it if missing."""
+        with self._cache_lock:
+            value = self.cache.get(key)
+        if value is None:
+            value = fetch()
+            with self._cache_lock:
+                self.cache.set(kind, key, value)
+        return value
 
-    def get_transition(self, issue, name):
-        return self.jira.find_transitionid_by_name(issue, name)
+    def get_create_meta(self, refresh=False):
+        """
+        Get issue creation metadata of the project.
+
+        Fields of issue types are not expanded, they take megabytes and cache
+        shares table with transitions read by every action.
+        """
+        key = f"{cache.CREATEMETA}:{self.server}:{self.project}"
+        if refresh:
+            with self._cache_lock:
+                self.cache.delete(key)
+        return self._cached(
+            cache.CREATEMETA,
+            key,
+            lambda: self.jira.createmeta(projectKeys=self.project),
+        )
+
+    def has_issue_type(self, name):
+        """Whether issues of the type can be created in the project."""
+        # Cached metadata could be outdated, type is looked up again
+        for refresh in (False, True):
+            meta = self.get_create_meta(refresh)
+            names = {
+                issue_type["name"]
+                for project in meta["projects"]
+                for issue_type in project["issuetypes"]
+            }
+            if name in names:
+                return True
+        return False
+
+    def warm_cache(self):
+        """Fetch metadata which is cached per project."""
+        self.get_create_meta()
+
+    def get_transitions(self, issue, issue_type, status, refresh=False):
+        """
+        Get transitions available for issue, by lowercase name.
+
+        Transitions are cached per project, issue type and status. Each
+        transition holds its ID and target status name.
+        """
+        key = f"{cache.TRANSITIONS}:{self.server}:{self.project}:{issue_type}:{status}"
+        if refresh:
+            with self._cache_lock:
+                self.cache.delete(key)
+        return self._cached(
+            cache.TRANSITIONS,
+            key,
+            lambda: {
+                t["name"].lower(): {"id": t["id"], "to": t["to"]["name"]}
+                for t in self.jira.transitions(issue)
+            },
+        )
 
-    def transition_issue(self, issue, transition):
-        transition_id = self.get_transition(issue, transition)
-        if transition_id:
-            self.jira.transition_issue(issue, transition_id)
+    def transition_issue(self, issue, name, issue_type, status):
+        """Transition issue from status. Return status after the transition."""
+        transitions = self.get_transitions(issue, issue_type, status)
+        transition = transitions.get(name.lower())
+        if transition is None:
+            return status
+
+        try:
+            self.jira.transition_issue(issue, transition["id"])
+        except JIRAError:
+            # Cached transition could be outdated, retry with current ones
+            fresh = self.get_transitions(issue, issue_type, status, refresh=True)
+            if fresh == transitions or name.lower() not in fresh:
+                raise
+            transition = fresh[name.lower()]
+            self.jira.transition_issue(issue, transition["id"])
+        return transition["to"]
 
     def assign_issue(self, issue, assignee):
         self.jira.assign_issue(issue, assignee)
 
     def make_action(self, action, issue):
-        issue.status = action.next_state
-        # Get jira issue to perform transitions
-        jira_issue = self.jira.issue(issue.key)
-        for transition in action.transitions:
-            self.transition_issue(jira_issue, transition)
+        if action.transitions:
+            # Current type and status select (cached) transitions
+            jira_issue = self.jira.issue(issue.key, fields=TRANSITION_FIELDS)
+            issue_type = jira_issue.fields.issuetype.name
+            status = jira_issue.fields.status.name
+            for transition in action.transitions:
+                status = self.transition_issue(
+                    issue.key, transition, issue_type, status
+                )
         if action.assign_to_user:
-            self.assign_issue(jira_issue, self.username)
+            self.assign_issue(issue.key, self.username)
+        issue.status = action.next_state
         return issue
 
     def _convert_to_issue(self, jira_issue):
@@ -97,17 +296,17 @@ class Jira(object):
 
     def _get_type(self, jira_issue):
         jira_type = jira_issue.fields.issuetype.name
-        for type_mapping in self.workflow.types:
-            if type_mapping.mapping == jira_type:
-                return type_mapping.issue_type
-        raise Exception(f"Unable to map issue type: {jira_type}")
+        issue_type = self.workflow.get_type(jira_type)
+        if issue_type is None:
+            raise Exception(f"Unable to map issue type: {jira_type}")
+        return issue_type
 
     def _get_status(self, jira_issue):
         jira_status = jira_issue.fields.status.name
-        for status_mapping in self.workflow.statuses:
-            if jira_status in status_mapping.mapping:
-                return status_mapping.status
-        raise Exception(f"Unable to map issue status: {jira_status}")
+        status = self.workflow.get_status(jira_status)
+        if status is None:
+            raise Exception(f"Unable to map issue status: {jira_status}")
+        return status
 
     def _get_subtasks(self, jira_issue):
         try:
@@ -117,3 +316,21 @@ class Jira(object):
             ]
         except AttributeError as e:
             return []
+
+
+def quote(value):
+    """Escape value for JQL string literal."""
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def quote_text(value):
+    """Escape value for JQL text search (`~`) string literal."""
+    return quote(TEXT_RESERVED.sub(r"\\\1", value))
+
+
+def key_lists(keys):
+    """Split keys into quoted, comma separated lists for `in (...)` clauses."""
+    keys = list(keys)
+    for start in range(0, len(keys), KEYS_PER_QUERY):
+        chunk = keys[start : start + KEYS_PER_QUERY]
+        yield ", ".join('"{}"'.format(quote(key)) for key in chunk)
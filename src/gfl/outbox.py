@@ -0,0 +1,54 @@
+"""Outbox of workflow actions waiting to be sent to JIRA."""
+import time
+
+from gfl.storage import get_table
+
+# Outcomes of replayed entries
+SENT = "sent"
+APPLIED = "applied"
+CONFLICT = "conflict"
+FAILED = "failed"
+
+
+class Outbox:
+    """
+    Actions already applied to local issues, kept in data directory.
+
+    Entries are replayed in order they were added.
+    """
+
+    def __init__(self):
+        self.db = get_table("outbox", "id")
+
+    def add(self, project, issue, action):
+        # Sortable by time of creation
+        id = f"{time.time_ns():020d}:{issue.key}"
+        self.db.insert(
+            {
+                "id": id,
+                "project": project.id,
+                "issue": issue.key,
+                "action": action.name,
+                "attempts": 0,
+                "error": None,
+            }
+        )
+
+    def entries(self):
+        return sorted(self.db.all(), key=lambda entry: entry["id"])
+
+    def has_pending(self, key):
+        return any(entry["issue"] == key for entry in self.db.all())
+
+    def failed(self, entry, error):
+        self.db.update(dict(entry, attempts=entry["attempts"] + 1, error=str(error)))
+
+    def remove(self, entry):
+        self.db.remove(entry["id"])
+
+    def drop(self, key):
+        """Remove all entries of issue. Return their count."""
+        entries = [entry for entry in self.db.all() if entry["issue"] == key]
+        for entry in entries:
+            self.remove(entry)
+        return len(entries)
@@ -1,13 +1,8 @@
-import questionary
 from marshmallow import Schema, fields, post_load
-from prompt_toolkit import prompt
-from tinydb import TinyDB
 
-from gfl.cli import print_simple_collection
 from gfl.db import EntityRepository, ForeignEntity
 from gfl.instances import InstanceEntity
 from gfl.workflow import WorkflowEntity
-from gfl.validators import UniqueID
 
 
 class Project:
@@ -23,7 +18,7 @@ class Project:
 
 class ProjectRepository(EntityRepository):
     def __init__(self):
-        super().__init__(Project, ProjectSchema(), "projects.json")
+        super().__init__(Project, ProjectSchema(), "projects")
 
 
 class ProjectEntity(ForeignEntity):
@@ -48,6 +43,10 @@ class ProjectCLI:
         self.workflows = workflow_repository
 
     def new(self):
+        import questionary
+        from prompt_toolkit import prompt
+        from gfl.validators import UniqueID
+
         id = prompt("Project ID: ", validator=UniqueID("Project", self.projects))
         key = questionary.text("Project key:").ask()
         instance_id = questionary.select(
@@ -65,4 +64,6 @@ class ProjectCLI:
         self.projects.save(project)
 
     def list(self):
+        from gfl.cli import print_simple_collection
+
         print_simple_collection(ProjectSchema(), self.projects.all(), "id")
@@ -1,4 +1,3 @@
-from marshmallow import Schema, fields, post_load
 OPEN = 'open'
 IN_PROGRESS = 'in_progress'
 REVIEW = 'review'
@@ -12,11 +11,3 @@ class IssueStatusMapping():
     def __init__(self, status, mapping):
         self.status = status
         self.mapping = mapping
-
-class IssueStatusMappingSchema(Schema):
-    status = fields.Str()
-    mapping = fields.Str()
-
-    @post_load
-    def deserialize(self, data, **kwargs):
-        return IssueStatusMapping(**data)
@@ -0,0 +1,355 @@
+"""
+Storage engines for repositories.
+
+Every repository keeps its entities in a table of JSON documents looked up
+by single identity field (ID, issue key or workspace path). Tables are
+stored either in TinyDB JSON files or in one SQLite database, depending on
+the ``storage`` configuration option.
+
+Within a session (see :func:`buffered_writes`) writes are kept in memory
+and flushed once, when the session ends.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from tinydb import TinyDB, Query
+from tinydb.storages import Storage, touch
+
+from gfl import config
+
+JSON = "json"
+SQLITE = "sqlite"
+
+SQLITE_FILE = "gfl.db"
+
+# Tables opened in this process, shared by all repositories
+_tables = {}
+_sqlite_connection = None
+# SQLite connection is shared by threads (e.g. concurrent workflow actions)
+_sqlite_lock = threading.RLock()
+
+# Tables with writes buffered in the current session
+_pending = None
+
+
+class CachedJSONStorage(Storage):
+    """
+    JSON storage which parses the file once and serves reads from memory.
+
+    File is replaced atomically (written to temporary file and renamed) on
+    each write, or once at the end of the session.
+    """
+
+    def __init__(self, path, **kwargs):
+        touch(path, create_dirs=True)
+        self.path = path
+        self.writes = 0
+        self._loaded = False
+        self._dirty = False
+        self._mtime = None
+        self._data = None
+
+    def read(self):
+        if not self._loaded:
+            with open(self.path, "r") as f:
+                self._mtime = os.fstat(f.fileno()).st_mtime_ns
+                content = f.read()
+            self._data = json.loads(content) if content else None
+            self._loaded = True
+        return self._data
+
+    def write(self, data):
+        self._data = data
+        self._loaded = True
+        self._dirty = True
+        self.writes += 1
+
+    def changed(self):
+        """Whether file was modified by another process since it was read."""
+        return os.stat(self.path).st_mtime_ns != self._mtime
+
+    def reload_if_changed(self):
+        """Drop loaded data if file was modified by another process."""
+        if not self._loaded or self._dirty or not self.changed():
+            return False
+        self.discard()
+        return True
+
+    def flush(self):
+        directory, name = os.path.split(self.path)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self._mtime = os.stat(self.path).st_mtime_ns
+        self._dirty = False
+
+    def discard(self):
+        self._loaded = False
+        self._dirty = False
+        self._data = None
+        self.writes += 1
+
+
+class JSONTable:
+    """
+    Table stored in TinyDB JSON file.
+
+    Writes not flushed yet are kept, so they can be replayed on top of the
+    file if another process changed it in the meantime.
+    """
+
+    def __init__(self, name, identity):
+        self.db = TinyDB(
+            os.path.join(config.DATA_DIR, f"{name}.json"), storage=CachedJSONStorage
+        )
+        self.identity = identity
+        self._writes = []
+
+    def _query(self, value):
+        return Query()[self.identity] == value
+
+    def _reset_caches(self):
+        # TinyDB caches computed from dropped data
+        self.db.clear_cache()
+        self.db.table(self.db.default_table_name)._next_id = None
+
+    def _revalidate(self):
+        if self.db.storage.reload_if_changed():
+            self._reset_caches()
+
+    def _write(self, operation, argument):
+        self._revalidate()
+        operation(argument)
+        self._writes.append((operation, argument))
+        if _pending is None:
+            self.flush()
+        else:
+            _pending.add(self)
+
+    def revision(self):
+        """Value changing whenever table content changes."""
+        self._revalidate()
+        storage = self.db.storage
+        return (os.stat(storage.path).st_mtime_ns, storage.writes)
+
+    def all(self):
+        self._revalidate()
+        return self.db.all()
+
+    def find(self, value):
+        self._revalidate()
+        return self.db.get(self._query(value))
+
+    def insert(self, document):
+        self._write(self._insert, document)
+
+    def update(self, document):
+        self._write(self._update, document)
+
+    def upsert(self, document):
+        self._write(self._upsert, document)
+
+    def remove(self, value):
+        self._write(self._remove, value)
+
+    def _insert(self, document):
+        self.db.insert(document)
+
+    def _update(self, document):
+        self.db.update(document, self._query(document[self.identity]))
+
+    def _upsert(self, document):
+        self.db.upsert(document, self._query(document[self.identity]))
+
+    def _remove(self, value):
+        self.db.remove(self._query(value))
+
+    def flush(self):
+        if not self._writes:
+            return
+        storage = self.db.storage
+        if storage.changed():
+            # Apply own writes on top of changes made by another process
+            storage.discard()
+            self._reset_caches()
+            for operation, argument in self._writes:
+                operation(argument)
+        storage.flush()
+        self._writes = []
+
+
+def _locked(method):
+    """Run method holding the SQLite connection lock."""
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        with _sqlite_lock:
+            return method(*args, **kwargs)
+
+    return wrapper
+
+
+class SQLiteTable:
+    """Table stored in SQLite database, indexed by the identity field."""
+
+    def __init__(self, connection, name, identity):
+        self.connection = connection
+        self.name = name
+        self.identity = identity
+        self._create()
+
+    def _create(self):
+        exists = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (self.name,),
+        ).fetchone()
+        if exists:
+            return
+
+        with self.connection:
+            self.connection.execute(
+                f"CREATE TABLE {self.name} "
+                f"({self.identity} TEXT PRIMARY KEY, document TEXT NOT NULL)"
+            )
+            self._migrate()
+
+    def _migrate(self):
+        """Import documents from JSON file used by the JSON storage."""
+        path = os.path.join(config.DATA_DIR, f"{self.name}.json")
+        if not os.path.exists(path) or not os.path.getsize(path):
+            return
+
+        with open(path, "r") as f:
+            data = json.load(f)
+
+        documents = data.get("_default", {})
+        for doc_id in sorted(documents, key=int):
+            self._upsert(documents[doc_id])
+
+    @_locked
+    def revision(self):
+        """Value changing whenever table content changes."""
+        data_version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+        return (data_version, self.connection.total_changes)
+
+    @_locked
+    def all(self):
+        rows = self.connection.execute(
+            f"SELECT document FROM {self.name} ORDER BY rowid"
+        )
+        return [json.loads(document) for (document,) in rows]
+
+    @_locked
+    def find(self, value):
+        row = self.connection.execute(
+            f"SELECT document FROM {self.name} WHERE {self.identity} = ?", (value,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _written(self):
+        if _pending is None:
+            self.flush()
+        else:
+            _pending.add(self)
+
+    def insert(self, document):
+        # Identity is unique here, inserting known entity replaces it
+        self.upsert(document)
+
+    @_locked
+    def update(self, document):
+        self.connection.execute(
+            f"UPDATE {self.name} SET document = ? WHERE {self.identity} = ?",
+            (json.dumps(document), document[self.identity]),
+        )
+        self._written()
+
+    @_locked
+    def upsert(self, document):
+        self._upsert(document)
+        self._written()
+
+    def _upsert(self, document):
+        self.connection.execute(
+            f"INSERT INTO {self.name} ({self.identity}, document) VALUES (?, ?) "
+            f"ON CONFLICT({self.identity}) DO UPDATE SET document = excluded.document",
+            (document[self.identity], json.dumps(document)),
+        )
+
+    @_locked
+    def remove(self, value):
+        self.connection.execute(
+            f"DELETE FROM {self.name} WHERE {self.identity} = ?", (value,)
+        )
+        self._written()
+
+    @_locked
+    def flush(self):
+        self.connection.commit()
+
+
+def get_sqlite_connection():
+    """Get SQLite connection, opening the database once per process."""
+    global _sqlite_connection
+    if _sqlite_connection is None:
+        os.makedirs(config.DATA_DIR, exist_ok=True)
+        path = os.path.join(config.DATA_DIR, SQLITE_FILE)
+        _sqlite_connection = sqlite3.connect(path, check_same_thread=False)
+        _sqlite_connection.execute("PRAGMA journal_mode = WAL")
+        _sqlite_connection.execute("PRAGMA synchronous = NORMAL")
+    return _sqlite_connection
+
+
+@_locked
+def get_table(name, identity):
+    """Get table for the configured storage, opening it once per process."""
+    if name not in _tables:
+        if config.STORAGE == SQLITE:
+            _tables[name] = SQLiteTable(get_sqlite_connection(), name, identity)
+        elif config.STORAGE == JSON:
+            _tables[name] = JSONTable(name, identity)
+        else:
+            raise ValueError(f"Unknown storage: {config.STORAGE}")
+    return _tables[name]
+
+
+@_locked
+def reset():
+    """Forget opened tables and close SQLite database, e.g. before fork."""
+    global _sqlite_connection
+    _tables.clear()
+    if _sqlite_connection is not None:
+        _sqlite_connection.close()
+        _sqlite_connection = None
+
+
+@contextmanager
+def buffered_writes():
+    """
+    Buffer writes of all tables and flush each touched table once on exit.
+
+    Writes are flushed also if the block raises, as they may mirror changes
+    already made in JIRA or in git. Nested block is a separate session,
+    flushed when it exits.
+    """
+    global _pending
+    outer = _pending
+    _pending = set()
+    try:
+        yield
+    finally:
+        pending, _pending = _pending, outer
+        for table in pending:
+            table.flush()
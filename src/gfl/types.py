@@ -1,5 +1,3 @@
-from marshmallow import Schema, fields, post_load
-
 STORY = 'story'
 SUBTASK = 'subtask'
 TASK = 'task'
@@ -12,12 +10,3 @@ class IssueTypeMapping():
         self.issue_type = issue_type
         self.mapping = mapping
         self.prefix = prefix
-
-class IssueTypeMappingSchema(Schema):
-    issue_type = fields.Str()
-    mapping = fields.Str()
-    prefix = fields.Str()
-
-    @post_load
-    def deserialize(self, data, **kwargs):
-        return IssueTypeMapping(**data)
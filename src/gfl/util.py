@@ -1,6 +1,5 @@
 """Utilities"""
 import re
-from gfl.issues import Issue
 
 
 def generate_branch_name(workflow, issue):
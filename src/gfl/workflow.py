@@ -1,18 +1,11 @@
-import questionary
+import ast
+
 from marshmallow import Schema, fields, post_load
-from prompt_toolkit import prompt, print_formatted_text, HTML
-from prompt_toolkit.formatted_text import FormattedText
-from prompt_toolkit.styles import Style
 
-from gfl.cli import print_simple_collection
 from gfl.db import EntityRepository, ForeignEntity
-from gfl.actions import Action, ActionSchema, ACTIONS
-from gfl.statuses import (
-    IssueStatusMapping,
-    IssueStatusMappingSchema,
-    STATUSES,
-)
-from gfl.types import IssueTypeMapping, IssueTypeMappingSchema, TYPES
+from gfl.actions import Action, ACTIONS
+from gfl.statuses import IssueStatusMapping, STATUSES
+from gfl.types import IssueTypeMapping, TYPES
 
 
 class Workflow:
@@ -21,32 +14,98 @@ class Workflow:
         self.statuses = []
         self.actions = []
         self.types = []
+        # Lookup tables, first mapping wins
+        self._actions = {}
+        self._types = {}
+        self._types_by_mapping = {}
+        self._statuses_by_mapping = {}
 
     def add_action(self, action):
         self.actions.append(action)
+        self._actions.setdefault(action.name, action)
 
     def add_status(self, status_mapping):
         self.statuses.append(status_mapping)
+        for jira_status in status_mapping.mapping:
+            self._statuses_by_mapping.setdefault(jira_status, status_mapping.status)
 
     def add_type(self, type_mapping):
         self.types.append(type_mapping)
+        self._types.setdefault(type_mapping.issue_type, type_mapping)
+        self._types_by_mapping.setdefault(type_mapping.mapping, type_mapping.issue_type)
 
     def get_action(self, name):
-        for a in self.actions:
-            if a.name == name:
-                return a
-        return None
+        return self._actions.get(name)
 
     def get_type_mapping(self, issue_type):
-        for t in self.types:
-            if t.issue_type == issue_type:
-                return t.mapping
-        return None
+        type_mapping = self._types.get(issue_type)
+        return type_mapping.mapping if type_mapping else None
 
     def get_branch_prefix(self, issue):
-        for t in self.types:
-            if t.issue_type == issue.type:
-                return t.prefix
+        type_mapping = self._types.get(issue.type)
+        return type_mapping.prefix if type_mapping else None
+
+    def get_type(self, jira_type):
+        """Get issue type mapped to JIRA issue type."""
+        return self._types_by_mapping.get(jira_type)
+
+    def get_status(self, jira_status):
+        """Get status mapped to JIRA status."""
+        return self._statuses_by_mapping.get(jira_status)
+
+
+class StatusMappingField(fields.Field):
+    """
+    List of JIRA statuses.
+
+    Older workflows store the list as its string representation.
+    """
+
+    def _serialize(self, value, attr, obj, **kwargs):
+        if value is None:
+            return []
+        return list(value)
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        if isinstance(value, list):
+            return value
+        if value.startswith("["):
+            return ast.literal_eval(value)
+        return parse_collection(value)
+
+
+class IssueStatusMappingSchema(Schema):
+    status = fields.Str()
+    mapping = StatusMappingField()
+
+    @post_load
+    def deserialize(self, data, **kwargs):
+        return IssueStatusMapping(**data)
+
+
+class IssueTypeMappingSchema(Schema):
+    issue_type = fields.Str()
+    mapping = fields.Str()
+    prefix = fields.Str()
+
+    @post_load
+    def deserialize(self, data, **kwargs):
+        return IssueTypeMapping(**data)
+
+
+class ActionSchema(Schema):
+    name = fields.Str()
+    initial_state = fields.Str()
+    transitions = fields.List(fields.Str(), allow_none=True)
+    next_state = fields.Str()
+    assign_to_user = fields.Bool()
+
+    @post_load
+    def deserialize(self, data, **kwargs):
+        a = Action(data["name"], data["initial_state"], data["next_state"])
+        a.transitions = data["transitions"]
+        a.assign_to_user = data["assign_to_user"]
+        return a
 
 
 class WorkflowSchema(Schema):
@@ -69,7 +128,7 @@ class WorkflowSchema(Schema):
 
 class WorkflowRepository(EntityRepository):
     def __init__(self):
-        super().__init__(Workflow, WorkflowSchema(), "workflows.json")
+        super().__init__(Workflow, WorkflowSchema(), "workflows")
 
 
 class WorkflowEntity(ForeignEntity):
@@ -80,6 +139,9 @@ class WorkflowCLI:
         self.workflow_repository = workflow_repository
 
     def new(self):
+        import questionary
+        from prompt_toolkit import prompt, print_formatted_text, HTML
+
         id = questionary.text("Workflow ID:").ask()
         workflow = Workflow(id)
         print()
@@ -123,6 +185,9 @@ class WorkflowCLI:
         self.workflow_repository.save(workflow)
 
     def list(self):
+        from prompt_toolkit import print_formatted_text, HTML
+        from gfl.cli import print_simple_collection
+
         for workflow in self.workflow_repository.all():
             print_formatted_text(HTML(f"<b>ID: </b>{workflow.id}"))
             print()
@@ -140,6 +205,8 @@ class WorkflowCLI:
 
 
 def prefixed_prompt(prefix, msg):
+    from prompt_toolkit import prompt
+
     msg = [("bold", f"({prefix}) "), ("", f"{msg}: ")]
     return prompt(msg)
 
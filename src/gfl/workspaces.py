@@ -1,13 +1,8 @@
-import json
 import pathlib
-import questionary
-from os import path
 
 from marshmallow import Schema, fields, post_load
-from tinydb import Query
 
 from gfl.db import Repository
-from gfl.cli import print_simple_collection
 from gfl.projects import ProjectEntity
 
 
@@ -17,6 +12,8 @@ class Workspace:
         self.project = project
         self.current_issue = None
         self.pr_url = pr_url
+        # Time of the last issues sync, as UNIX timestamp
+        self.last_sync = None
 
     def set_current_issue(self, issue):
         self.current_issue = issue.key
@@ -36,47 +33,62 @@ class WorkspaceSchema(Schema):
     project = ProjectEntity()
     pr_url = fields.Str(allow_none=True)
     current_issue = fields.Str(allow_none=True)
+    last_sync = fields.Float(allow_none=True)
 
     @post_load
     def deserialize(self, data, **kwargs):
         workspace = Workspace(data["path"], data["project"], data["pr_url"])
         workspace.current_issue = data["current_issue"]
+        workspace.last_sync = data.get("last_sync")
         return workspace
 
 
 class WorkspaceRepository(Repository):
+    identity = "path"
+
     def __init__(self):
-        super().__init__(Workspace, WorkspaceSchema(), "workspaces.json")
+        super().__init__(Workspace, WorkspaceSchema(), "workspaces")
+        self._paths = None
+        self._paths_revision = None
+
+    @property
+    def paths(self):
+        """Stored workspaces by path, rebuilt when the table changes."""
+        revision = self.db.revision()
+        if self._paths is None or revision != self._paths_revision:
+            self._paths = {document["path"]: document for document in self.db.all()}
+            self._paths_revision = revision
+        return self._paths
 
     def upsert(self, workspace):
-        query = Query()
-        self.db.upsert(workspace.__dict__, query.path == workspace.path)
+        self.db.upsert(workspace.__dict__)
+        self.forget(workspace)
 
     def exists(self, path):
-        workspace = Query()
-        return bool(self.db.search(workspace.path.matches(path)))
+        return path in self.paths
 
     def get_by_path(self, path):
-        workspace = Query()
-        try:
-            return self.schema.load(self.db.search(workspace.path == path)[0])
-        except IndexError:
+        document = self.paths.get(path)
+        if document is None:
             return None
+        return self.load(document)
 
     def get_current_workspace(self):
         path = pathlib.Path().absolute()
+        paths = self.paths
 
-        # Traverse path upwards to get the workspace
-        workspace = None
-        while workspace == None and path.as_posix() != "/":
-            workspace = self.get_by_path(path.as_posix())
-            path = path.parent
+        # Nearest workspace containing current directory
+        for directory in [path, *path.parents]:
+            directory = directory.as_posix()
+            if directory != "/" and directory in paths:
+                return self.load(paths[directory])
 
-        return workspace
+        return None
 
     def update(self, workspace):
         serialized = self.schema.dump(workspace)
-        self.db.update(serialized, Query().path == workspace.path)
+        self.db.update(serialized)
+        self.forget(workspace)
 
 
 class WorkspaceCLI:
@@ -85,6 +97,8 @@ class WorkspaceCLI:
         self.projects = project_repository
 
     def init(self):
+        import questionary
+
         path = pathlib.Path().absolute().as_posix()
         project = questionary.select(
             "Choose project:", choices=self.projects.ids()
@@ -96,4 +110,6 @@ class WorkspaceCLI:
         self.workspaces.upsert(w)
 
     def list(self):
+        from gfl.cli import print_simple_collection
+
         print_simple_collection(WorkspaceSchema(), self.workspaces.all(), "path")
@@ -0,0 +1,102 @@
+"""Commands used from git hooks and editors must stay cheap to import."""
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+
+# Cumulative time of `import gfl`, in microseconds. Importing the JIRA client
+# alone takes longer.
+IMPORT_TIME_BUDGET = 100000
+
+HEAVY_MODULES = ["jira", "prompt_toolkit", "questionary"]
+
+SEED = """
+from gfl.credentials import Credentials, CredentialsRepository
+from gfl.instances import Instance, InstanceRepository
+from gfl.issues import Issue, IssueRepository
+from gfl.projects import Project, ProjectRepository
+from gfl.statuses import IssueStatusMapping
+from gfl.types import IssueTypeMapping
+from gfl.workflow import Workflow, WorkflowRepository
+from gfl.workspaces import Workspace, WorkspaceRepository
+
+credentials = Credentials("c", "user", "user@example.com", "token")
+CredentialsRepository().save(credentials)
+instance = Instance("i", "https://jira.example.com", "server", credentials)
+InstanceRepository().save(instance)
+workflow = Workflow("w")
+workflow.add_type(IssueTypeMapping("task", "Task", "task/"))
+workflow.add_status(IssueStatusMapping("in_progress", ["In Progress"]))
+WorkflowRepository().save(workflow)
+project = Project("p", "ABC", instance, workflow)
+ProjectRepository().save(project)
+workspace = Workspace(sys.argv[1], project, "https://example.com/pr/%s")
+workspace.current_issue = "ABC-1"
+WorkspaceRepository().save(workspace)
+IssueRepository().save(Issue("ABC-1", "Task", "task", "in_progress"))
+"""
+
+# Git itself is not under test, commands only have to get to it
+RUN = """
+import gfl
+from gfl import git
+
+git.commit = git.push = lambda *args, **kwargs: None
+gfl.gfl(sys.argv[1:], prog_name="gfl", standalone_mode=False)
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+class ImportTimeTest(unittest.TestCase):
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.home)
+        self.workspace = os.path.join(self.home, "workspace")
+        os.makedirs(self.workspace)
+        self.env = dict(os.environ, HOME=self.home, PYTHONPATH=SRC_DIR)
+
+    def python(self, args, script=None):
+        if script is not None:
+            args = ["-c", "import json, sys\n" + textwrap.dedent(script)] + args
+        return subprocess.run(
+            [sys.executable] + args,
+            cwd=self.workspace,
+            env=self.env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        )
+
+    def imported_modules(self, *args):
+        self.python([self.workspace], SEED)
+        output = self.python(list(args), RUN).stdout
+        return json.loads(output.splitlines()[-1])
+
+    def assert_light(self, modules):
+        for name in HEAVY_MODULES:
+            self.assertNotIn(name, modules)
+
+    def test_commit_does_not_import_jira_or_tui(self):
+        self.assert_light(self.imported_modules("commit", "message"))
+
+    def test_publish_does_not_import_jira_or_tui(self):
+        self.assert_light(self.imported_modules("publish"))
+
+    def test_import_time_within_budget(self):
+        stderr = self.python(["-X", "importtime", "-c", "import gfl"]).stderr
+        match = re.search(r"^import time:\s+\d+ \|\s+(\d+) \| gfl$", stderr, re.M)
+
+        self.assertIsNotNone(match)
+        self.assertLess(int(match.group(1)), IMPORT_TIME_BUDGET)
+
+
+if __name__ == "__main__":
+    unittest.main()